@@ -0,0 +1,261 @@
+"""
+End-to-end load test of obs-api.
+
+Starts a fleet of mock OBS stands (tests/mock_obs_server.py) and obs-api
+itself (uvicorn main:app, with Postgres from DB_CONFIG), both in separate
+processes. It registers a benchmark user with all stands through the API,
+then drives a weighted mix of bot requests at the given concurrency.
+Throughput and p50/p95/p99 latency are reported per endpoint and saved
+as JSON. Pass a previous result with --compare to see the difference.
+
+    cd obs-api && python benchmarks/load_test.py --stands 50 --concurrency 32 --duration 30
+    python benchmarks/load_test.py --url http://localhost:8000 --no-fleet --stand-host 10.0.0.5 --base-port 4455
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import httpx
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(API_DIR, 'benchmarks', 'results')
+
+# доли запросов в смеси по умолчанию: бот в основном опрашивает статусы
+DEFAULT_MIX = 'ping_stream=40,ping_obs=20,check_obs=10,get_scenes=15,start_stop_stream=10,start_stop_recording=5'
+
+
+def percentile(sorted_values: List[float], share: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # nearest-rank
+    return sorted_values[max(0, math.ceil(share * len(sorted_values)) - 1)]
+
+
+class Recorder:
+    """
+    Latencies and status codes of every request, grouped by endpoint.
+    """
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.status_codes: Dict[str, Dict[str, int]] = {}
+
+    def record(self, endpoint: str, status_code, latency_ms: float):
+        self.latencies.setdefault(endpoint, []).append(latency_ms)
+        codes = self.status_codes.setdefault(endpoint, {})
+        codes[str(status_code)] = codes.get(str(status_code), 0) + 1
+
+    def summary(self, duration: float) -> dict:
+        endpoints = {}
+        for endpoint, latencies in sorted(self.latencies.items()):
+            values = sorted(latencies)
+            codes = self.status_codes[endpoint]
+            endpoints[endpoint] = {
+                'requests': len(values),
+                'errors': sum(count for code, count in codes.items() if not code.startswith('2')),
+                'status_codes': codes,
+                'throughput_rps': round(len(values) / duration, 1),
+                'mean_ms': round(sum(values) / len(values), 1),
+                'p50_ms': round(percentile(values, 0.50), 1),
+                'p95_ms': round(percentile(values, 0.95), 1),
+                'p99_ms': round(percentile(values, 0.99), 1),
+                'max_ms': round(values[-1], 1)}
+        total = sum(item['requests'] for item in endpoints.values())
+        return {'requests': total,
+                'errors': sum(item['errors'] for item in endpoints.values()),
+                'throughput_rps': round(total / duration, 1),
+                'endpoints': endpoints}
+
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, user_id: str, stands: List[str], recorder: Recorder):
+        self.client = client
+        self.user_id = user_id
+        self.stands = stands  # имена стендов пользователя
+        self.recorder = recorder
+
+    async def call(self, method: str, endpoint: str, body: dict):
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, endpoint, json=body)
+            status_code = response.status_code
+        except httpx.HTTPError as err:
+            status_code = type(err).__name__
+        self.recorder.record(endpoint, status_code, (time.perf_counter() - started) * 1000)
+
+    def stand(self) -> dict:
+        return {'user_id': self.user_id, 'obs_name': random.choice(self.stands)}
+
+    async def ping_stream(self):
+        await self.call('GET', '/ping_stream', self.stand())
+
+    async def ping_obs(self):
+        await self.call('GET', '/ping_obs', self.stand())
+
+    async def check_obs(self):
+        await self.call('GET', '/check_obs', {'user_id': self.user_id, 'need_availability': True})
+
+    async def get_scenes(self):
+        await self.call('GET', '/get_scenes', self.stand())
+
+    async def start_stop_stream(self):
+        stand = self.stand()
+        await self.call('POST', '/start_stream', {**stand, 'key': 'bench-key',
+                                                  'youtube_server': 'rtmp://127.0.0.1/live2'})
+        await self.call('POST', '/stop_stream', stand)
+
+    async def start_stop_recording(self):
+        stand = self.stand()
+        await self.call('POST', '/start_recording', stand)
+        await self.call('POST', '/stop_recording', stand)
+
+    async def worker(self, scenarios: List[str], weights: List[float], until: float):
+        while time.monotonic() < until:
+            await getattr(self, random.choices(scenarios, weights)[0])()
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    result = {}
+    for item in mix.split(','):
+        name, weight = item.split('=')
+        if not hasattr(LoadTest, name.strip()):
+            raise SystemExit(f'Unknown scenario {name!r}')
+        result[name.strip()] = float(weight)
+    return result
+
+
+async def wait_for_port(host: str, port: int, timeout: float):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise SystemExit(f'Nothing is listening on {host}:{port} after {timeout} s')
+            await asyncio.sleep(0.2)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def compare(current: dict, previous: dict):
+    print(f"\n{'endpoint':<22}{'rps':>16}{'p50 ms':>18}{'p99 ms':>18}")
+    for endpoint, item in current['endpoints'].items():
+        old = previous['endpoints'].get(endpoint)
+        if old is None:
+            continue
+        print(f"{endpoint:<22}"
+              f"{old['throughput_rps']:>8} -> {item['throughput_rps']:<5}"
+              f"{old['p50_ms']:>9} -> {item['p50_ms']:<6}"
+              f"{old['p99_ms']:>9} -> {item['p99_ms']:<6}")
+
+
+async def run(args) -> dict:
+    processes = []
+    try:
+        if not args.no_fleet:
+            processes.append(subprocess.Popen(
+                [sys.executable, os.path.join(API_DIR, 'tests', 'mock_obs_server.py'), '--count', str(args.stands),
+                 '--base-port', str(args.base_port), '--password', args.stand_password,
+                 '--latency', str(args.latency), '--jitter', str(args.jitter)], cwd=API_DIR))
+            await wait_for_port(args.stand_host, args.base_port + args.stands - 1, 30)
+        url = args.url
+        if url is None:
+            port = free_port()
+            processes.append(subprocess.Popen(
+                [sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(port), '--log-level', 'warning'],
+                cwd=API_DIR))
+            await wait_for_port('127.0.0.1', port, 30)
+            url = f'http://127.0.0.1:{port}'
+
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=url, timeout=args.timeout, limits=limits) as client:
+            user_id = str(random.randint(10 ** 8, 10 ** 9))
+            stands = [f'bench_{i}' for i in range(args.stands)]
+            await client.post('/register_user', json={'user_id': user_id})
+            try:
+                for i, name in enumerate(stands):
+                    response = await client.post('/add_obs', json={
+                        'user_id': user_id, 'obs_name': name, 'ip': args.stand_host,
+                        'port': str(args.base_port + i), 'password': args.stand_password})
+                    response.raise_for_status()
+
+                recorder = Recorder()
+                load = LoadTest(client, user_id, stands, recorder)
+                mix = parse_mix(args.mix)
+                if args.warmup:
+                    warmup_until = time.monotonic() + args.warmup
+                    await asyncio.gather(*(load.worker(list(mix), list(mix.values()), warmup_until)
+                                           for _ in range(args.concurrency)))
+                    load.recorder = recorder = Recorder()  # прогрев в результаты не попадает
+                started = time.monotonic()
+                await asyncio.gather(*(load.worker(list(mix), list(mix.values()), started + args.duration)
+                                       for _ in range(args.concurrency)))
+                duration = time.monotonic() - started
+            finally:
+                # стенды убираем через API, даже если прогон упал
+                for name in stands:
+                    await client.request('DELETE', '/delete_obs', json={'user_id': user_id, 'obs_name': name})
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+    return {'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'duration_s': round(duration, 2),
+            'config': vars(args), **recorder.summary(duration)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default=None, help='running obs-api; by default one is started')
+    parser.add_argument('--stands', type=int, default=20)
+    parser.add_argument('--no-fleet', action='store_true', help='stands are already running')
+    parser.add_argument('--stand-host', default='127.0.0.1')
+    parser.add_argument('--base-port', type=int, default=5000)
+    parser.add_argument('--stand-password', default='bench')
+    parser.add_argument('--latency', type=float, default=0.01, help='mock stand response latency, s')
+    parser.add_argument('--jitter', type=float, default=0.005)
+    parser.add_argument('--concurrency', type=int, default=16, help='simultaneous bot clients')
+    parser.add_argument('--duration', type=float, default=30, help='seconds of measured load')
+    parser.add_argument('--warmup', type=float, default=5, help='seconds of unmeasured load before it')
+    parser.add_argument('--timeout', type=float, default=30, help='HTTP timeout, s')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='scenario=weight,...')
+    parser.add_argument('--output', default=None, help='JSON file for results')
+    parser.add_argument('--compare', default=None, help='previous JSON result to compare with')
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    print(f"{'endpoint':<22}{'requests':>10}{'errors':>8}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for endpoint, item in result['endpoints'].items():
+        print(f"{endpoint:<22}{item['requests']:>10}{item['errors']:>8}{item['throughput_rps']:>9}"
+              f"{item['p50_ms']:>9}{item['p95_ms']:>9}{item['p99_ms']:>9}")
+    print(f"total: {result['requests']} requests, {result['errors']} errors, {result['throughput_rps']} rps")
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"load-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, 'w') as file:
+        json.dump(result, file, indent=2)
+    print(f'saved to {output}')
+
+    if args.compare:
+        with open(args.compare) as file:
+            compare(result, json.load(file))
+
+
+if __name__ == '__main__':
+    main()
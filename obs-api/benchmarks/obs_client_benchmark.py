@@ -0,0 +1,118 @@
+"""
+Compares simpleobsws with obs_client.ObsClient (JSON and msgpack subprotocols):
+request throughput of concurrent GetStats calls and decode rate of
+InputVolumeMeters events. Runs against a minimal local obs-websocket v5
+server, so no OBS is needed:
+
+    cd obs-api && python benchmarks/obs_client_benchmark.py --requests 5000 --events 20000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import simpleobsws
+import websockets
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from obs_client import ObsClient, msgpack  # noqa: E402
+
+STATS = {'cpuUsage': 3.2, 'memoryUsage': 512.4, 'availableDiskSpace': 120000.0, 'activeFps': 30.0,
+         'averageFrameRenderTime': 1.4, 'renderSkippedFrames': 0, 'renderTotalFrames': 100000,
+         'outputSkippedFrames': 0, 'outputTotalFrames': 100000, 'webSocketSessionIncomingMessages': 10,
+         'webSocketSessionOutgoingMessages': 10}
+# так выглядит InputVolumeMeters: OBS шлёт его ~20 раз в секунду на каждый вход
+VOLUME_METERS = {'inputs': [{'inputName': f'Mic {i}', 'inputLevelsMul': [[0.1, 0.2, 0.3], [0.1, 0.2, 0.3]]}
+                            for i in range(8)]}
+
+
+async def serve(ws, path=None):
+    binary = ws.subprotocol == 'obswebsocket.msgpack'
+
+    async def send(message):
+        await ws.send(msgpack.packb(message) if binary else json.dumps(message))
+
+    await send({'op': 0, 'd': {'obsWebSocketVersion': '5.0.0', 'rpcVersion': 1}})
+    async for raw in ws:
+        message = msgpack.unpackb(raw, raw=False) if binary else json.loads(raw)
+        op, data = message['op'], message['d']
+        if op == 1:
+            await send({'op': 2, 'd': {'negotiatedRpcVersion': 1}})
+        elif op == 6 and data['requestType'] == 'GetStats':
+            await send({'op': 7, 'd': {'requestType': 'GetStats', 'requestId': data['requestId'],
+                                       'requestStatus': {'result': True, 'code': 100}, 'responseData': STATS}})
+        elif op == 6 and data['requestType'] == 'EmitVolumeMeters':  # команда только этого сервера
+            for _ in range(data['requestData']['count']):
+                await send({'op': 5, 'd': {'eventType': 'InputVolumeMeters', 'eventIntent': 65536,
+                                           'eventData': VOLUME_METERS}})
+
+
+async def bench_requests(client, count: int, concurrency: int) -> float:
+    request = simpleobsws.Request('GetStats')
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await client.call(request)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(count)))
+    return count / (time.perf_counter() - started)
+
+
+async def bench_events(client, count: int) -> float:
+    received = 0
+    done = asyncio.Event()
+
+    async def on_meters(data):
+        nonlocal received
+        received += 1
+        if received == count:
+            done.set()
+
+    client.register_event_callback(on_meters, 'InputVolumeMeters')
+    started = time.perf_counter()
+    # запрос-триггер без ожидания ответа: сервер отвечает только событиями
+    message = {'op': 6, 'd': {'requestType': 'EmitVolumeMeters', 'requestId': 'emit',
+                              'requestData': {'count': count}}}
+    if getattr(client, 'subprotocol', None) == 'obswebsocket.msgpack':
+        await client.ws.send(msgpack.packb(message))
+    else:
+        await client.ws.send(json.dumps(message))
+    await done.wait()
+    return count / (time.perf_counter() - started)
+
+
+async def main(args):
+    server = await websockets.serve(serve, '127.0.0.1', args.port, max_size=2 ** 24,
+                                    subprotocols=['obswebsocket.msgpack', 'obswebsocket.json'])
+    url = f'ws://127.0.0.1:{args.port}'
+    clients = {'simpleobsws (json)': lambda: simpleobsws.WebSocketClient(url=url),
+               'ObsClient (json)': lambda: ObsClient(url=url, use_msgpack=False)}
+    if msgpack is not None:
+        clients['ObsClient (msgpack)'] = lambda: ObsClient(url=url)
+    else:
+        print('msgpack is not installed, skipping the msgpack client')
+
+    print(f"{'client':<22}{'requests/s':>14}{'events/s':>14}")
+    for name, factory in clients.items():
+        client = factory()
+        await client.connect()
+        await client.wait_until_identified()
+        requests_rate = await bench_requests(client, args.requests, args.concurrency)
+        events_rate = await bench_events(client, args.events)
+        await client.disconnect()
+        print(f'{name:<22}{requests_rate:>14.0f}{events_rate:>14.0f}')
+    server.close()
+    await server.wait_closed()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--port', type=int, default=4499)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,72 @@
+import time
+from typing import Dict
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker of one stand. Opens after failure_threshold consecutive
+    connect failures, fails fast while open and after reset_timeout lets a
+    single trial connection through (half-open state).
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        """
+        Returns True if a connection attempt may be made right now.
+        """
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.time() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self._trial_in_flight = False
+        if self._trial_in_flight:
+            return False
+        self._trial_in_flight = True
+        return True
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.time()
+
+    def to_dict(self) -> dict:
+        return {'state': self.state, 'failures': self.failures, 'opened_at': self.opened_at}
+
+
+class CircuitBreakerRegistry:
+    """
+    Circuit breakers of all stands, keyed by ip:port.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, key: str) -> CircuitBreaker:
+        if key not in self._breakers:
+            self._breakers[key] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return self._breakers[key]
+
+    def states(self) -> Dict[str, dict]:
+        return {key: breaker.to_dict() for key, breaker in self._breakers.items()}
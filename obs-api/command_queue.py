@@ -0,0 +1,103 @@
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional
+
+
+class StandActor:
+    """
+    Command queue of one stand. Commands run one at a time in the order
+    they were submitted, by a worker task that lives while the queue is not empty.
+    on_idle(actor) is called when the worker has drained the queue.
+    """
+
+    def __init__(self, key: str, on_idle: Optional[Callable[['StandActor'], None]] = None):
+        self.key = key
+        self.on_idle = on_idle
+        self._queue = deque()  # (factory, future, enqueued_at)
+        self._worker = None
+        self.running = False
+        self.processed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.last_wait = 0.0
+
+    def submit(self, factory: Callable[[], Awaitable]) -> asyncio.Future:
+        future = asyncio.get_event_loop().create_future()
+        self._queue.append((factory, future, time.monotonic()))
+        if self._worker is None:
+            self._worker = asyncio.ensure_future(self._work())
+        return future
+
+    async def _work(self):
+        try:
+            while self._queue:
+                factory, future, enqueued_at = self._queue.popleft()
+                if future.done():  # вызывающий уже не ждёт
+                    continue
+                wait = time.monotonic() - enqueued_at
+                self.last_wait = wait
+                self.max_wait = max(self.max_wait, wait)
+                self.total_wait += wait
+                self.processed += 1
+                self.running = True
+                try:
+                    result = await factory()
+                except asyncio.CancelledError:
+                    # отменена команда или сам обработчик: остальные команды очереди всё равно выполняются
+                    future.cancel()
+                except Exception as err:
+                    if not future.done():
+                        future.set_exception(err)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+                finally:
+                    self.running = False
+        finally:
+            self._worker = None
+            if self.on_idle is not None and not self._queue:
+                self.on_idle(self)
+
+    def to_dict(self) -> dict:
+        return {'depth': len(self._queue) + int(self.running),
+                'processed': self.processed,
+                'last_wait_ms': round(self.last_wait * 1000, 1),
+                'max_wait_ms': round(self.max_wait * 1000, 1),
+                'mean_wait_ms': round(self.total_wait / self.processed * 1000, 1) if self.processed else 0.0}
+
+
+class StandCommandQueues:
+    """
+    Serializes mutating commands per stand: commands to one stand never
+    overlap, commands to different stands run in parallel. An actor exists
+    only while its stand has queued commands.
+    """
+
+    def __init__(self):
+        self._actors: Dict[str, StandActor] = {}
+
+    async def run(self, key: str, factory: Callable[[], Awaitable], timeout: float = None):
+        """
+        Queues factory() on the stand with this ip:port key and returns its result.
+        A command whose caller gave up (asyncio.TimeoutError or cancellation)
+        before its turn is dropped from the queue.
+        """
+        if key not in self._actors:
+            self._actors[key] = StandActor(key, on_idle=self._drop)
+        future = self._actors[key].submit(factory)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    def _drop(self, actor: StandActor):
+        if self._actors.get(actor.key) is actor:
+            del self._actors[actor.key]
+
+    def stats(self) -> Dict[str, dict]:
+        return {key: actor.to_dict() for key, actor in self._actors.items()}
+
+
+stand_commands = StandCommandQueues()
@@ -1,12 +1,14 @@
 import json
 import uuid
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from datetime import datetime
 
 from fastapi import HTTPException
 from typing import Tuple, Union, List, Any
 
 from sqlalchemy import text, TextClause
-from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncConnection
 
 from loguru import logger
 
@@ -32,6 +34,35 @@ class Database:
           """
         self._database_url = f"postgresql+asyncpg://{user}:{password}@{host}:{port}/{database}"
         self._engine = create_async_engine(self._database_url, echo=True)
+        # connection of the current transaction() block, separate for every asyncio task
+        self._connection: ContextVar[Union[AsyncConnection, None]] = ContextVar(f'db_connection_{id(self)}',
+                                                                                default=None)
+
+    @asynccontextmanager
+    async def transaction(self):
+        """
+        Unit of work: every execute() inside the block runs on one pooled connection in one
+        transaction, which is committed when the block exits and rolled back if it raises.
+        A nested block joins the outer transaction.
+
+        The connection is bound to the current asyncio task, so statements inside the block
+        must not run concurrently (no asyncio.gather over db calls).
+
+        Example:
+            async with db.transaction():
+                await db.check_user_in_db(user_id)
+                await db.add_users_obs(user_id, obs_name, ip, port, encrypted_password)
+        """
+        connection = self._connection.get()
+        if connection is not None:
+            yield connection
+            return
+        async with self._engine.begin() as connection:
+            token = self._connection.set(connection)
+            try:
+                yield connection
+            finally:
+                self._connection.reset(token)
 
     async def execute(self, query: Union[str, TextClause], *args, **kwargs):
         """
@@ -47,8 +78,12 @@ class Database:
 
         This method provides a generic interface for executing various types of SQL queries. It opens an asynchronous
         connection with the database, executes the provided query, and returns the result. This method is suitable
-        for executing queries that modify the database as well as for fetching data.
+        for executing queries that modify the database as well as for fetching data. Inside a transaction() block
+        the query runs on the block's connection instead.
         """
+        connection = self._connection.get()
+        if connection is not None:
+            return await connection.execute(query, *args, **kwargs)
         async with self._engine.begin() as conn:
             result = await conn.execute(query, *args, **kwargs)
             return result
@@ -104,6 +139,15 @@ class Database:
         result = await self.execute(query, {'user_id': int(user_id), 'obs_name': obs_name})
         return result.fetchone()
 
+    async def get_obs_infos(self, user_id: str, obs_names: List[str]):
+        query = text("""
+            SELECT "UO_name", "OBS_ip", "OBS_port", "OBS_pswd"
+            FROM obs INNER JOIN users_obs USING("OBS_id")
+            WHERE user_id = :user_id AND "UO_name" = ANY(:obs_names)
+        """)
+        result = await self.execute(query, {'user_id': int(user_id), 'obs_names': list(obs_names)})
+        return result.fetchall()
+
     async def get_group_obs_info(self, group_id: str, obs_name: str):
         query = text("""
             SELECT "OBS_ip", "OBS_port", "OBS_pswd" 
@@ -113,11 +157,41 @@ class Database:
         result = await self.execute(query, {'group_id': group_id, 'obs_name': obs_name})
         return result.fetchone()
 
+    async def get_group_obs_infos(self, group_id: str):
+        query = text("""
+            SELECT "GO_name", "OBS_ip", "OBS_port", "OBS_pswd"
+            FROM groups_obs INNER JOIN obs USING("OBS_id")
+            WHERE group_id = :group_id
+        """)
+        result = await self.execute(query, {'group_id': group_id})
+        return result.fetchall()
+
+    async def get_all_stands(self):
+        """
+        Returns (ip, port, password) of every stand some user or group has, one row per ip and port.
+        obs rows nobody refers to are left out. If copies of a stand have different passwords,
+        the one most copies have is taken (ties are broken by the password itself).
+        """
+        query = text("""
+            SELECT DISTINCT ON ("OBS_ip", "OBS_port") "OBS_ip", "OBS_port", "OBS_pswd"
+            FROM (
+                SELECT ob."OBS_ip", ob."OBS_port", ob."OBS_pswd", count(*) AS copies
+                FROM obs ob
+                WHERE EXISTS (SELECT 1 FROM users_obs uo WHERE uo."OBS_id" = ob."OBS_id")
+                OR EXISTS (SELECT 1 FROM groups_obs go WHERE go."OBS_id" = ob."OBS_id")
+                GROUP BY ob."OBS_ip", ob."OBS_port", ob."OBS_pswd"
+            ) stands
+            ORDER BY "OBS_ip", "OBS_port", copies DESC, "OBS_pswd"
+        """)
+        result = await self.execute(query)
+        return result.fetchall()
+
     async def find_obs_groups(self, ip: str, port: str):
         query = text("""
-            SELECT group_id 
-            FROM groups_obs WHERE "OBS_id" = (
-                SELECT "OBS_id" from obs WHERE "OBS_ip" = :ip AND "OBS_port" = :port LIMIT 1);
+            SELECT DISTINCT go.group_id
+            FROM groups_obs go INNER JOIN obs ob ON ob."OBS_id" = go."OBS_id"
+            WHERE ob."OBS_ip" = :ip AND ob."OBS_port" = :port
+            ORDER BY go.group_id
         """)
         result = await self.execute(query, {'ip': ip, 'port': int(port)})
         rows = result.fetchall()
@@ -151,43 +225,82 @@ class Database:
         await self.execute(insert_query, {'obs_id': str(obs_id), 'ip': ip, 'port': int(port), 'encrypted_password': encrypted_password})
 
 
-    async def add_groups_obs(self, group_id: str, admin_id: str, obs_name: str, ip: str, port: str, encrypted_password: str):
-        # Check for duplicate OBS in the group
+    async def add_groups_obs(self, group_id: str, admin_id: str, obs_name: str) -> List[Tuple[int, bool]]:
+        """
+        Adds a copy of the admin's OBS stand to the group and to every other group member
+        in one transaction. The group and every member get their own obs row, so editing
+        one copy never changes the others. A member who already has a stand with this name
+        or address is skipped.
+
+        Returns:
+            (user_id, added) for every group member except the admin.
+        """
+        find_obs_query = text("""
+            SELECT "OBS_ip", "OBS_port", "OBS_pswd"
+            FROM obs INNER JOIN users_obs USING("OBS_id")
+            WHERE user_id = :admin_id AND "UO_name" = :obs_name
+        """)
         check_group_obs_query = text("""
             SELECT 1 FROM groups_obs INNER JOIN obs USING("OBS_id")
             WHERE group_id = :group_id AND
             ("GO_name" = :obs_name OR ("OBS_ip" = :ip AND "OBS_port" = :port))
         """)
-        result = await self.execute(check_group_obs_query, {'group_id': group_id,
-                                                            'obs_name': obs_name,
-                                                            'ip': ip, 'port': int(port)})
-        if result.scalar():
-            raise HTTPException(status_code=409, detail=f'Duplicated OBS in group.')
-
-        find_obs_id_query = text(f"""
-        SELECT "OBS_id" from obs 
-        WHERE "OBS_ip" = :ip AND "OBS_port" = :port;
-        """)
-        result = await self.execute(find_obs_id_query, {'ip': ip, 'port': int(port)})
-        if not result:
-            raise HTTPException(status_code=404, detail=f'OBS with ip {ip} and port {port} not found.')
-
-        for row in result:
-            obs_id = row[0]
-            break
-
-        # Insert OBS into group_obs_info
         insert_group_obs_query = text("""
-            INSERT INTO groups_obs (group_id, "OBS_id", "GO_name") 
-            VALUES (:group_id, :obs_id, :obs_name)
-        """)
-        await self.execute(insert_group_obs_query, {'group_id': group_id, 'obs_id': obs_id, 'obs_name': obs_name})
-        insert_group_obs_query = text("""
-                    INSERT INTO obs ("OBS_id", "OBS_ip", "OBS_port", "OBS_pswd") 
-                    VALUES (:obs_id, :ip, :port, :encrypted_password)
-                """)
-        await self.execute(insert_group_obs_query, {'obs_id': obs_id, 'ip': ip, 'port': port,
-                                                    'encrypted_password': encrypted_password})
+            WITH group_obs AS (
+                INSERT INTO obs ("OBS_id", "OBS_ip", "OBS_port", "OBS_pswd")
+                VALUES (:obs_id, :ip, :port, :encrypted_password)
+                RETURNING "OBS_id"
+            )
+            INSERT INTO groups_obs (group_id, "OBS_id", "GO_name")
+            SELECT :group_id, "OBS_id", :obs_name FROM group_obs
+        """)
+        # one statement for all members: duplicates by name or address are filtered out,
+        # every other member gets a new obs row, and the members that got the stand
+        # come back from RETURNING. users_obs has no unique (user_id, "UO_name"), so the
+        # duplicate check is not atomic: a stand the member adds concurrently under the
+        # same name is not seen by it
+        propagate_query = text("""
+            WITH members AS (
+                SELECT user_id FROM group_membership WHERE group_id = :group_id AND user_id <> :admin_id
+            ), targets AS (
+                SELECT m.user_id, CAST(gen_random_uuid() AS VARCHAR) AS obs_id
+                FROM members m
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM users_obs uo INNER JOIN obs ob ON ob."OBS_id" = uo."OBS_id"
+                    WHERE uo.user_id = m.user_id
+                    AND (uo."UO_name" = :obs_name OR (ob."OBS_ip" = :ip AND ob."OBS_port" = :port))
+                )
+            ), inserted AS (
+                INSERT INTO users_obs (user_id, "OBS_id", "UO_name", "UO_access_grant")
+                SELECT user_id, obs_id, :obs_name, TRUE FROM targets
+                RETURNING user_id, "OBS_id"
+            ), copies AS (
+                INSERT INTO obs ("OBS_id", "OBS_ip", "OBS_port", "OBS_pswd")
+                SELECT "OBS_id", :ip, :port, :encrypted_password FROM inserted
+            )
+            SELECT m.user_id, i.user_id IS NOT NULL
+            FROM members m LEFT JOIN inserted i USING(user_id)
+            ORDER BY m.user_id
+        """)
+        async with self.transaction():
+            result = await self.execute(find_obs_query, {'admin_id': int(admin_id), 'obs_name': obs_name})
+            obs = result.fetchone()
+            if not obs:
+                raise HTTPException(status_code=404, detail='OBS with this name not found')
+            ip, port, encrypted_password = obs
+
+            result = await self.execute(check_group_obs_query, {'group_id': group_id, 'obs_name': obs_name,
+                                                                'ip': ip, 'port': port})
+            if result.scalar():
+                raise HTTPException(status_code=409, detail=f'Duplicated OBS in group.')
+
+            await self.execute(insert_group_obs_query, {'group_id': group_id, 'obs_id': str(uuid.uuid4()),
+                                                        'obs_name': obs_name, 'ip': ip, 'port': port,
+                                                        'encrypted_password': encrypted_password})
+            result = await self.execute(propagate_query, {'group_id': group_id, 'admin_id': int(admin_id),
+                                                          'obs_name': obs_name, 'ip': ip, 'port': port,
+                                                          'encrypted_password': encrypted_password})
+            return [(row[0], row[1]) for row in result.fetchall()]
 
     async def check_user_in_group(self, group_id: str, user_id: str) -> bool:
         query = text("""
@@ -206,6 +319,55 @@ class Database:
         await self.execute(query, {'group_id': group_id,
                                    'user_id': int(user_id), 'is_admin': is_admin})
 
+    async def add_users_to_group(self, group_id: str, user_ids: List[str], is_admins: List[bool]) -> List[int]:
+        """
+        Adds many users to the group in one transaction: registers unknown users, adds memberships
+        and gives the new members their own copy of every group stand they do not already have by name or address.
+
+        Returns:
+            ids of the users that were not members of the group before.
+        """
+        insert_users_query = text("""
+            INSERT INTO users ("U_id")
+            SELECT unnest(CAST(:user_ids AS VARCHAR[]))
+            ON CONFLICT DO NOTHING
+        """)
+        insert_members_query = text("""
+            INSERT INTO group_membership (group_id, user_id, "M_admin")
+            SELECT :group_id, m.user_id, m.is_admin
+            FROM unnest(CAST(:user_ids AS BIGINT[]), CAST(:is_admins AS BOOLEAN[])) AS m(user_id, is_admin)
+            ON CONFLICT (group_id, user_id) DO NOTHING
+            RETURNING user_id
+        """)
+        # every new member gets its own copy (obs row) of each group stand
+        inherit_obs_query = text("""
+            WITH targets AS (
+                SELECT m.user_id, go."GO_name", ob."OBS_ip", ob."OBS_port", ob."OBS_pswd",
+                       CAST(gen_random_uuid() AS VARCHAR) AS obs_id
+                FROM unnest(CAST(:user_ids AS BIGINT[])) AS m(user_id)
+                CROSS JOIN groups_obs go INNER JOIN obs ob ON ob."OBS_id" = go."OBS_id"
+                WHERE go.group_id = :group_id AND NOT EXISTS (
+                    SELECT 1 FROM users_obs uo INNER JOIN obs uob ON uob."OBS_id" = uo."OBS_id"
+                    WHERE uo.user_id = m.user_id
+                    AND (uo."UO_name" = go."GO_name" OR (uob."OBS_ip" = ob."OBS_ip" AND uob."OBS_port" = ob."OBS_port"))
+                )
+            ), copies AS (
+                INSERT INTO obs ("OBS_id", "OBS_ip", "OBS_port", "OBS_pswd")
+                SELECT obs_id, "OBS_ip", "OBS_port", "OBS_pswd" FROM targets
+            )
+            INSERT INTO users_obs (user_id, "OBS_id", "UO_name", "UO_access_grant")
+            SELECT user_id, obs_id, "GO_name", TRUE FROM targets
+        """)
+        async with self.transaction():
+            await self.execute(insert_users_query, {'user_ids': [str(user_id) for user_id in user_ids]})
+            result = await self.execute(insert_members_query, {'group_id': group_id,
+                                                               'user_ids': [int(user_id) for user_id in user_ids],
+                                                               'is_admins': list(is_admins)})
+            added = [row[0] for row in result.fetchall()]
+            if added:
+                await self.execute(inherit_obs_query, {'group_id': group_id, 'user_ids': added})
+            return added
+
     async def get_group_obs_names(self, group_id: str):
         query = text("""
             SELECT "GO_name" FROM groups_obs 
@@ -263,36 +425,63 @@ class Database:
         else:
             raise HTTPException(status_code=400, detail=f'No such field as {field_to_change}')
 
-    async def edit_groups_obs(self, group_id: str, obs_name: str, field_to_change: str, new_value):
+    async def edit_groups_obs(self, group_id: str, obs_name: str, field_to_change: str, new_value) -> dict:
+        """
+        Edits a group OBS stand with one statement for the group and all of its members.
+        Members' copies of the stand are their stands with the same name and address.
+        A rename is applied to the groups_obs row and to the members' copies,
+        ip, port and password are set on the obs rows of the group and of the copies.
+
+        Returns:
+            numbers of updated groups_obs, users_obs and obs rows.
+        """
+        copies = """
+            WITH group_obs AS (
+                SELECT go."OBS_id", ob."OBS_ip", ob."OBS_port"
+                FROM groups_obs go INNER JOIN obs ob ON ob."OBS_id" = go."OBS_id"
+                WHERE go.group_id = :group_id AND go."GO_name" = :obs_name
+            ), member_copies AS (
+                SELECT uo.user_id, uo."OBS_id"
+                FROM users_obs uo
+                INNER JOIN group_membership gm ON gm.user_id = uo.user_id AND gm.group_id = :group_id
+                INNER JOIN obs ob ON ob."OBS_id" = uo."OBS_id"
+                INNER JOIN group_obs ON group_obs."OBS_ip" = ob."OBS_ip" AND group_obs."OBS_port" = ob."OBS_port"
+                WHERE uo."UO_name" = :obs_name
+            )"""
         if field_to_change == 'obs_name':
-            query = text("""
-                UPDATE groups_obs 
-                SET "GO_name" = :new_value 
-                WHERE group_id = :group_id AND "GO_name" = :obs_name
+            query = text(copies + """, renamed_group AS (
+                    UPDATE groups_obs
+                    SET "GO_name" = :new_value
+                    WHERE group_id = :group_id AND "OBS_id" IN (SELECT "OBS_id" FROM group_obs)
+                    RETURNING "OBS_id"
+                ), renamed_users AS (
+                    UPDATE users_obs
+                    SET "UO_name" = :new_value
+                    WHERE (user_id, "OBS_id") IN (SELECT user_id, "OBS_id" FROM member_copies)
+                    RETURNING user_id
+                )
+                SELECT (SELECT count(*) FROM renamed_group), (SELECT count(*) FROM renamed_users), 0
             """)
-            await self.execute(query, {'group_id': group_id, 'obs_name': obs_name, 'new_value': new_value})
         elif field_to_change in {'ip', 'port', 'password'}:
             field_in_db_mapping = {'ip': "OBS_ip", 'port': "OBS_port", 'password': "OBS_pswd"}
             field_in_db = field_in_db_mapping[field_to_change]
             if field_to_change == "port":
                 new_value = int(new_value)
-            obs_id_subquery = text("""
-                SELECT "OBS_id" FROM groups_obs 
-                WHERE group_id = :group_id AND "GO_name" = :obs_name
+            query = text(copies + f""", updated AS (
+                    UPDATE obs
+                    SET "{field_in_db}" = :new_value
+                    WHERE "OBS_id" IN (SELECT "OBS_id" FROM group_obs UNION SELECT "OBS_id" FROM member_copies)
+                    RETURNING "OBS_id"
+                )
+                SELECT (SELECT count(*) FROM group_obs), 0, (SELECT count(*) FROM updated)
             """)
-            obs_id_result = await self.execute(obs_id_subquery, {'group_id': group_id, 'obs_name': obs_name})
-            obs_id = obs_id_result.scalar()
-
-            if obs_id:
-                update_query = text(f"""
-                    UPDATE obs 
-                    SET "{field_in_db}" = :new_value 
-                    WHERE "OBS_id" = :obs_id
-                """)
-                await self.execute(update_query, {'obs_id': obs_id, 'new_value': new_value})
         else:
             raise HTTPException(status_code=400, detail=f'No such field as {field_to_change}')
 
+        result = await self.execute(query, {'group_id': group_id, 'obs_name': obs_name, 'new_value': new_value})
+        groups_obs, users_obs, obs = result.fetchone()
+        return {'groups_obs': groups_obs, 'users_obs': users_obs, 'obs': obs}
+
     async def get_group_members(self, group_id: str):
         query = text("""
             SELECT user_id FROM group_membership 
@@ -319,58 +508,89 @@ class Database:
         return row is not None and row[0]  # row[0] is the M_admin value
 
     async def delete_users_obs(self, user_id: str, obs_name: str) -> str:
-        # First, get the IP of the OBS to be deleted for return value
-        get_ip_query = text("""
-            SELECT obs."OBS_ip", obs."OBS_id"
-            FROM users_obs INNER JOIN obs ON users_obs."OBS_id" = obs."OBS_id"
-            WHERE user_id = :user_id AND "UO_name" = :obs_name
+        """
+        Deletes the user's stand with one statement. Its obs row is deleted too
+        unless another user or a group still refers to it.
+
+        Returns:
+            IP of the deleted stand.
+        """
+        query = text("""
+            WITH deleted AS (
+                DELETE FROM users_obs
+                WHERE user_id = :user_id AND "UO_name" = :obs_name
+                RETURNING "OBS_id"
+            ), deleted_obs AS (
+                DELETE FROM obs
+                WHERE "OBS_id" IN (SELECT "OBS_id" FROM deleted)
+                AND NOT EXISTS (
+                    SELECT 1 FROM users_obs uo
+                    WHERE uo."OBS_id" = obs."OBS_id"
+                    AND NOT (uo.user_id = :user_id AND uo."UO_name" = :obs_name)
+                )
+                AND NOT EXISTS (SELECT 1 FROM groups_obs go WHERE go."OBS_id" = obs."OBS_id")
+            )
+            SELECT ob."OBS_ip"
+            FROM deleted INNER JOIN obs ob ON ob."OBS_id" = deleted."OBS_id"
         """)
-        result = await self.execute(get_ip_query, {'user_id': int(user_id), 'obs_name': obs_name})
+        result = await self.execute(query, {'user_id': int(user_id), 'obs_name': obs_name})
         res = result.fetchall()
         if not res:
             raise HTTPException(status_code=404, detail='OBS with this name not found')
-        obs_ip, obs_id = res[0]
 
-        # Delete the OBS stand
-        delete_query = text("""
-            DELETE FROM users_obs 
-            WHERE user_id = :user_id AND "UO_name" = :obs_name
-        """)
-        await self.execute(delete_query, {'user_id': int(user_id), 'obs_name': obs_name})
+        return res[0][0]
 
-        return obs_ip
+    async def delete_groups_obs(self, group_id: str, obs_name: str) -> Tuple[str, int]:
+        """
+        Deletes the stand from the group and its copies from all non-admin group members with one statement.
+        Members' copies are their stands with the same name and address. obs rows of the group and
+        of the deleted copies are deleted too unless something else still refers to them.
 
-    async def delete_groups_obs(self, group_id: str, obs_name: str) -> str:
-        # Get the OBS ID to be deleted for return value
-        get_obs_id_query = text("""
-            SELECT "OBS_id" FROM groups_obs
-            WHERE group_id = :group_id AND "GO_name" = :obs_name
+        Returns:
+            OBS_id of the deleted stand and the number of members that lost it.
+        """
+        query = text("""
+            WITH group_obs AS (
+                SELECT go."OBS_id", ob."OBS_ip", ob."OBS_port"
+                FROM groups_obs go INNER JOIN obs ob ON ob."OBS_id" = go."OBS_id"
+                WHERE go.group_id = :group_id AND go."GO_name" = :obs_name
+            ), member_copies AS (
+                SELECT uo.user_id, uo."OBS_id"
+                FROM users_obs uo
+                INNER JOIN group_membership gm ON gm.user_id = uo.user_id AND gm.group_id = :group_id
+                INNER JOIN obs ob ON ob."OBS_id" = uo."OBS_id"
+                INNER JOIN group_obs ON group_obs."OBS_ip" = ob."OBS_ip" AND group_obs."OBS_port" = ob."OBS_port"
+                WHERE uo."UO_name" = :obs_name AND gm."M_admin" = False
+            ), deleted_group AS (
+                DELETE FROM groups_obs
+                WHERE group_id = :group_id AND "OBS_id" IN (SELECT "OBS_id" FROM group_obs)
+                RETURNING "OBS_id"
+            ), deleted_users AS (
+                DELETE FROM users_obs
+                WHERE (user_id, "OBS_id") IN (SELECT user_id, "OBS_id" FROM member_copies)
+                RETURNING user_id
+            ), deleted_obs AS (
+                DELETE FROM obs
+                WHERE "OBS_id" IN (SELECT "OBS_id" FROM group_obs UNION SELECT "OBS_id" FROM member_copies)
+                AND NOT EXISTS (
+                    SELECT 1 FROM users_obs uo
+                    WHERE uo."OBS_id" = obs."OBS_id"
+                    AND (uo.user_id, uo."OBS_id") NOT IN (SELECT user_id, "OBS_id" FROM member_copies)
+                )
+                AND NOT EXISTS (
+                    SELECT 1 FROM groups_obs go
+                    WHERE go."OBS_id" = obs."OBS_id" AND go.group_id <> :group_id
+                )
+            )
+            SELECT (SELECT "OBS_id" FROM deleted_group), (SELECT count(DISTINCT user_id) FROM deleted_users)
         """)
-        result = await self.execute(get_obs_id_query, {'group_id': group_id, 'obs_name': obs_name})
-        obs_id = result.scalar()
+        result = await self.execute(query, {'group_id': group_id, 'obs_name': obs_name})
+        obs_id, affected_members = result.fetchone()
 
         if not obs_id:
             raise HTTPException(status_code=404, detail='OBS with this name not found in group')
 
-        # delete from all users
-        delete_from_users_query = text("""
-            DELETE FROM users_obs
-            USING group_membership, groups_obs
-            WHERE users_obs.user_id = group_membership.user_id
-            AND group_membership."M_admin" = False
-            AND group_membership.group_id = :group_id
-            AND groups_obs."OBS_id" = :obs_id;
-        """)
-        await self.execute(delete_from_users_query, {'group_id': group_id, 'obs_id': obs_id})
-
-        # Delete the OBS stand
-        delete_query = text("""
-            DELETE FROM groups_obs 
-            WHERE group_id = :group_id AND "GO_name" = :obs_name
-        """)
-        await self.execute(delete_query, {'group_id': group_id, 'obs_name': obs_name})
-
-        return obs_id
+        return obs_id, affected_members
 
     async def remove_user_obs_by_id(self, user_id: str, obs_id: str):
         delete_query = text("""
@@ -0,0 +1,72 @@
+import asyncio
+import time
+from typing import Awaitable, Dict
+
+from utils import OBS_TIMEOUTS
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised when an OBS operation doesn't fit into the request's time budget.
+    """
+
+    def __init__(self, phase: str, deadline: 'Deadline'):
+        super().__init__(f'OBS {phase} timed out after {deadline.elapsed_ms()} ms')
+        self.phase = phase
+        self.deadline = deadline
+
+    def to_dict(self) -> dict:
+        return {'phase': self.phase, **self.deadline.to_dict()}
+
+
+class Deadline:
+    """
+    Time budget of one API request. Every OBS phase (connect, identify,
+    request) gets its own timeout from OBS_TIMEOUTS, cut to what is left of the budget.
+    """
+
+    def __init__(self, budget: float = None):
+        self.budget = OBS_TIMEOUTS['budget'] if budget is None else budget
+        self.started = time.monotonic()
+        self.timings: Dict[str, float] = {}  # phase -> ms spent in it
+
+    def elapsed_ms(self) -> float:
+        return round((time.monotonic() - self.started) * 1000, 1)
+
+    def remaining(self) -> float:
+        return self.budget - (time.monotonic() - self.started)
+
+    def child(self, budget: float) -> 'Deadline':
+        """
+        Returns a deadline with its own budget that never outlives this one.
+        """
+        return Deadline(min(budget, self.remaining()))
+
+    def timeout(self, phase: str) -> float:
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(phase, self)
+        return min(OBS_TIMEOUTS[phase], remaining)
+
+    async def run(self, phase: str, awaitable: Awaitable):
+        """
+        Awaits awaitable within the timeout of the phase and records time spent.
+        """
+        try:
+            timeout = self.timeout(phase)
+        except DeadlineExceeded:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise
+        started = time.monotonic()
+        try:
+            return await asyncio.wait_for(awaitable, timeout=timeout)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(phase, self)
+        finally:
+            spent = (time.monotonic() - started) * 1000
+            self.timings[phase] = round(self.timings.get(phase, 0) + spent, 1)
+
+    def to_dict(self) -> dict:
+        return {'elapsed_ms': self.elapsed_ms(), 'budget_ms': round(self.budget * 1000, 1),
+                'timings': self.timings}
@@ -0,0 +1,132 @@
+import asyncio
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+import simpleobsws
+from loguru import logger
+
+from db_class import Database
+from deadline import Deadline
+from obs_functions import obs_call
+from obs_sessions import connection_manager, stand_key
+from obs_state import stand_states
+from telemetry import stand_telemetry
+
+
+@dataclass
+class ProbeResult:
+    """
+    Result of one background availability probe. checked_at is unix time.
+    """
+    available: bool
+    latency_ms: float
+    checked_at: float = field(default_factory=time.time)
+    stats: Optional[dict] = None  # ответ GetStats, если стенд доступен
+
+    def to_dict(self) -> dict:
+        return {'availability': self.available, 'latency_ms': self.latency_ms,
+                'checked_at': self.checked_at}
+
+
+class HealthProbeScheduler:
+    """
+    Background service that probes every stand users and groups have with
+    GetStats on a jittered interval and keeps the last result for ttl seconds.
+    Stands that are streaming or recording are probed more often. Probes use
+    the shared session pool, so at most max_stands stands are probed.
+    """
+
+    def __init__(self, db: Database, idle_interval: float, active_interval: float, jitter: float,
+                 concurrency: int, ttl: float, timeout: float, stands_refresh: float, max_stands: int):
+        self.db = db
+        self.max_stands = max_stands
+        self.idle_interval = idle_interval
+        self.active_interval = active_interval
+        self.jitter = jitter
+        self.ttl = ttl
+        self.timeout = timeout
+        self.stands_refresh = stands_refresh
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._results: Dict[str, ProbeResult] = {}
+        self._stands: Dict[str, tuple] = {}  # ip:port -> (ip, port, password)
+        self._next_probe: Dict[str, float] = {}
+        self._in_flight = set()
+        self._task = None
+
+    def availability(self, key: str) -> Optional[ProbeResult]:
+        """
+        Returns the last probe result of the stand if it is younger than ttl.
+        """
+        result = self._results.get(key)
+        if result is None or time.time() - result.checked_at > self.ttl:
+            return None
+        return result
+
+    def _interval(self, key: str) -> float:
+        state = stand_states.state(key)
+        interval = self.active_interval if state.stream_active or state.record_active else self.idle_interval
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    async def _load_stands(self):
+        stands = {stand_key(ip, port): (ip, port, password)
+                  for ip, port, password in await self.db.get_all_stands()}
+        if len(stands) > self.max_stands:
+            # сессии проверок живут в общем пуле: при большем числе стендов они вытесняли
+            # бы сессии запросов и подписки на события, поэтому сначала берём открытые сессии
+            logger.warning(f'Health probe is limited to {self.max_stands} of {len(stands)} OBS stands')
+            keys = sorted(stands, key=lambda key: not connection_manager.is_identified(key))[:self.max_stands]
+            stands = {key: stands[key] for key in keys}
+        self._stands = stands
+        self._next_probe = {key: when for key, when in self._next_probe.items() if key in stands}
+        # новые стенды проверяем вразнобой, чтобы не нагружать всех одновременно
+        for key in stands:
+            self._next_probe.setdefault(key, time.monotonic() + random.uniform(0, self.active_interval))
+
+    async def probe(self, key: str) -> ProbeResult:
+        ip, port, password = self._stands[key]
+        deadline = Deadline(self.timeout)
+        try:
+            obsclient = connection_manager.get_client(ip, port, password)
+            ret = await obs_call(obsclient, simpleobsws.Request('GetStats'), deadline)
+            result = ProbeResult(True, deadline.elapsed_ms(), stats=ret.responseData)
+            stand_telemetry.record(key, ret.responseData, result.checked_at)
+        except Exception as err:
+            logger.debug(f'Health probe of OBS {key} failed: {err}')
+            result = ProbeResult(False, deadline.elapsed_ms())
+        self._results[key] = result
+        return result
+
+    async def _probe_in_background(self, key: str):
+        try:
+            async with self._semaphore:
+                await self.probe(key)
+        finally:
+            self._in_flight.discard(key)
+            self._next_probe[key] = time.monotonic() + self._interval(key)
+
+    async def _run(self):
+        stands_loaded_at = None
+        while True:
+            try:
+                if stands_loaded_at is None or time.monotonic() - stands_loaded_at > self.stands_refresh:
+                    await self._load_stands()
+                    stands_loaded_at = time.monotonic()
+                now = time.monotonic()
+                for key in self._stands:
+                    if key not in self._in_flight and self._next_probe[key] <= now:
+                        self._in_flight.add(key)
+                        asyncio.get_event_loop().create_task(self._probe_in_background(key))
+            except Exception as err:
+                logger.error(f'Health probe scheduler error: {err}')
+            await asyncio.sleep(1)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_event_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -1,27 +1,71 @@
+import asyncio
 import datetime
 
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Header, HTTPException, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import JSONResponse, Response
 from loguru import logger
 
 # from cryptography.fernet import Fernet
+from command_queue import stand_commands
 from conductor import Conductor
 # from database import RedisDatabase
 from db_class import Database
-from obs_functions import start_youtube_stream, set_stream_parameters, start_recording
-from obs_functions import stop_youtube_stream, ping_stream, stream_time, ping_recording, \
-    recording_time, stop_recording, ping_obs, get_scenes, set_scene
+from deadline import Deadline, DeadlineExceeded
+from health import HealthProbeScheduler
+from obs_sessions import connection_manager, ObsConnectionError, client_key, stand_key
+from obs_state import stand_states
+from preview import preview_cache
+from response_cache import ResponseCache, user_tag, group_tag, stand_tag
+from stream_quality import StreamQualityMonitor
+from telemetry import stand_telemetry
+from warmup import StandWarmUp
+from obs_functions import start_youtube_stream, ping_stream, stream_time, ping_recording, \
+    recording_time, ping_obs, get_scenes, set_scene, scene_exists, stop_youtube_stream
+from obs_functions import start_stream_batch, stop_stream_batch, start_recording_batch, \
+    stop_recording_batch, batch_failure, OUTPUT_RUNNING, OUTPUT_NOT_RUNNING
 from schemas import UserId, CalendarData, CalendarDataStop
 from schemas import UsersAddObs, UserDelObs, UsersEditObs, CheckObs, StartStreamModel, \
     StopStreamModel, StartRecordingModel, StopRecordingModel, UserPingStreamObs, PlanStreamModel, UserObs, \
-    GetScenesModel, SetSceneModel, AddGroup, AddGroupMember, DeleteGroupMember, AddGroupObs, \
-    EditGroupObs, DeleteGroupObs, CheckGroupObs, CheckObsGroups
-from utils import config_obsclient_calendar, DB_CONFIG
+    GetScenesModel, SetSceneModel, ObsStatsModel, PreviewModel, AddGroup, AddGroupMember, AddGroupMembers, \
+    DeleteGroupMember, AddGroupObs, BulkStartStreamModel, BulkStandsModel, EditGroupObs, DeleteGroupObs, \
+    CheckGroupObs, CheckObsGroups
+from utils import config_obsclient_calendar, run_bounded, DB_CONFIG, OBS_PROBE_CONFIG, OBS_HEALTH_CONFIG, \
+    OBS_STREAM_QUALITY_CONFIG, OBS_PREVIEW_CONFIG, OBS_BULK_CONFIG, OBS_WARMUP_CONFIG, RESPONSE_CACHE_CONFIG
 
 db = Database(**DB_CONFIG)
 # new_db = Database(**DB_CONFIG)
 app = FastAPI()
 conductor = Conductor(db)
+health_monitor = HealthProbeScheduler(db, **OBS_HEALTH_CONFIG)
+stream_monitor = StreamQualityMonitor(**OBS_STREAM_QUALITY_CONFIG)
+warm_up = StandWarmUp(db, **OBS_WARMUP_CONFIG)
+response_cache = ResponseCache(**RESPONSE_CACHE_CONFIG)
+
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request, exc: DeadlineExceeded):
+    """
+    Стенд не уложился в бюджет времени запроса: отдаём отдельную ошибку с таймингами
+    """
+    logger.info(f'{request.url.path}: {exc}')
+    return JSONResponse(status_code=504,
+                        content={'text': 'Obs stand timed out', **exc.to_dict()})
+
+
+@app.on_event('startup')
+async def start_monitors():
+    # прогрев идёт в фоне: сервис сразу жив (/ping), но готов (/ready) после прогрева
+    warm_up.start()
+    health_monitor.start()
+    stream_monitor.start()
+
+
+@app.on_event('shutdown')
+async def close_obs_sessions():
+    await warm_up.stop()
+    await health_monitor.stop()
+    await stream_monitor.stop()
+    await connection_manager.close()
 
 
 # @app.get('/show_bd')
@@ -44,6 +88,23 @@ async def register_user(user_id: UserId):
     return JSONResponse(content={'user_id': user_id.user_id})
 
 
+async def run_output_batch(batch, conflict_code: int, conflict_content, success_content):
+    """
+    Выполняет пачку запуска/остановки вывода и переводит её результат в
+    (код ответа, тело ответа). conflict_code -- код OBS, при котором вывод уже
+    в нужном состоянии (OUTPUT_RUNNING или OUTPUT_NOT_RUNNING)
+    """
+    try:
+        failed = batch_failure(await batch)
+    except ObsConnectionError:
+        return 409, 'Obs stand is unavailable'
+    if failed is not None:
+        if failed.requestStatus.code == conflict_code:
+            return 409, conflict_content
+        return 500, f'Obs request {failed.requestType} failed: {failed.requestStatus.comment}'
+    return 200, success_content
+
+
 @app.post('/start_stream')
 async def start_stream(request_body: StartStreamModel):
     """
@@ -54,23 +115,18 @@ async def start_stream(request_body: StartStreamModel):
     :param request_body:
     :return:
     """
+    deadline = Deadline()
     obsclient = await conductor.get_obs_client(request_body.user_id, request_body.obs_name)
-    flag = await ping_obs(obsclient)
-    if not flag:
-        return JSONResponse(status_code=409,
-                            content='Obs stand is unavailable')
-    flag = await ping_stream(obsclient)
-    if flag:
-        return JSONResponse(status_code=409,
-                            content='Obs stand with this ip currently in use')
-    await set_stream_parameters(obsclient, request_body.key,
-                                request_body.youtube_server)
-    await start_youtube_stream(obsclient, request_body.key,
-                               request_body.youtube_server)
+    # проверка, настройка и запуск -- одной пачкой запросов
+    status_code, content = await run_output_batch(
+        start_stream_batch(obsclient, request_body.key, request_body.youtube_server, deadline=deadline),
+        OUTPUT_RUNNING, 'Obs stand with this ip currently in use', {'response': "started stream successfully"})
+    if status_code != 200:
+        return JSONResponse(status_code=status_code, content=content)
     logger.info(f"Started stream on obs "
                 f"{obsclient.url.split('ws://')[1].split(':')[0]} by user "
                 f"{request_body.user_id}")
-    return JSONResponse(content={'response': "started stream successfully"})
+    return JSONResponse(content=content)
 
 
 @app.post('/stop_stream')
@@ -83,19 +139,17 @@ async def stop_stream(request_body: StopStreamModel):
     :return:
     """
     logger.info('Stopping stream')
+    deadline = Deadline()
     obsclient = await conductor.get_obs_client(request_body.user_id, request_body.obs_name)
 
-    flag = await ping_obs(obsclient)
-    if not flag:
-        return JSONResponse(status_code=409,
-                            content='Obs stand is unavailable')
-    if not await ping_stream(obsclient):
-        return JSONResponse(status_code=409,
-                            content={'response': "Stream not running"})
+    status_code, content = await run_output_batch(
+        stop_stream_batch(obsclient, deadline=deadline),
+        OUTPUT_NOT_RUNNING, {'response': "Stream not running"}, {'response': "stopped successfully"})
+    if status_code != 200:
+        return JSONResponse(status_code=status_code, content=content)
 
-    await stop_youtube_stream(obsclient)
     logger.info(f'Stream stopped successfully by {request_body.user_id}')
-    return JSONResponse(content={'response': "stopped successfully"})
+    return JSONResponse(content=content)
 
 
 @app.post('/start_recording')
@@ -108,19 +162,17 @@ async def start_recording_handler(request_body: StartRecordingModel):
     :param request_body:
     :return:
     """
+    deadline = Deadline()
     obsclient = await conductor.get_obs_client(request_body.user_id, request_body.obs_name)
-    if not await ping_obs(obsclient):
-        return JSONResponse(status_code=409,
-                            content='Obs stand is unavailable')
-
-    if await ping_recording(obsclient):
-        return JSONResponse(status_code=409,
-                            content='Obs stand with this ip currently in use')
-    await start_recording(obsclient)
+    status_code, content = await run_output_batch(
+        start_recording_batch(obsclient, deadline=deadline),
+        OUTPUT_RUNNING, 'Obs stand with this ip currently in use', {'response': "started recording successfully"})
+    if status_code != 200:
+        return JSONResponse(status_code=status_code, content=content)
     logger.info(f"Started recording on obs "
                 f"{obsclient.url.split('ws://')[1].split(':')[0]} by user "
                 f"{request_body.user_id}")
-    return JSONResponse(content={'response': "started recording successfully"})
+    return JSONResponse(content=content)
 
 
 @app.post('/stop_recording')
@@ -133,20 +185,120 @@ async def stop_recording_handler(request_body: StopRecordingModel):
     :param request_body:
     :return:
     """
+    deadline = Deadline()
     obsclient = await conductor.get_obs_client(request_body.user_id, request_body.obs_name)
-    if not await ping_obs(obsclient):
-        return JSONResponse(status_code=409,
-                            content='Obs stand is unavailable')
-
-    flag = await ping_recording(obsclient)
-    if not flag:
-        return JSONResponse(status_code=409,
-                            content=f'The recording is not running')
-    await stop_recording(obsclient)
-    logger.info(f"Started recording on obs "
+    status_code, content = await run_output_batch(
+        stop_recording_batch(obsclient, deadline=deadline),
+        OUTPUT_NOT_RUNNING, 'The recording is not running', {'response': "stopped recording successfully"})
+    if status_code != 200:
+        return JSONResponse(status_code=status_code, content=content)
+    logger.info(f"Stopped recording on obs "
                 f"{obsclient.url.split('ws://')[1].split(':')[0]} by user "
                 f"{request_body.user_id}")
-    return JSONResponse(content={'response': "started recording successfully"})
+    return JSONResponse(content=content)
+
+
+async def run_bulk(user_id: str, obs_names: list, command) -> dict:
+    """
+    Выполняет command(obs_name, obsclient, deadline) на нескольких стендах
+    параллельно (не больше OBS_BULK_CONFIG['concurrency'] одновременно).
+    Данные всех стендов достаются из БД одним запросом. command возвращает
+    (код ответа, тело ответа); результат -- словарь {'имя обс': {'status_code': ..., 'response': ...}}.
+    У каждого стенда свой бюджет времени, а ошибка одного стенда попадает
+    только в его результат и не роняет остальные
+    """
+    obs_names = list(dict.fromkeys(obs_names))  # без повторов, в исходном порядке
+    clients = await conductor.get_obs_clients(user_id, obs_names)
+
+    async def run(name):
+        if name not in clients:
+            return 404, 'OBS with this name not found'
+        # отсчёт идёт с момента, когда стенд дождался своей очереди в run_bounded
+        deadline = Deadline()
+        try:
+            return await command(name, clients[name], deadline)
+        except DeadlineExceeded as exc:
+            return 504, {'text': 'Obs stand timed out', **exc.to_dict()}
+        except HTTPException as exc:
+            return exc.status_code, exc.detail
+        except Exception as exc:
+            logger.exception(f'Bulk command on obs {name} of user {user_id} failed')
+            return 500, f'Obs request failed: {exc!r}'
+
+    results = await run_bounded(run, obs_names, OBS_BULK_CONFIG['concurrency'])
+    resp = dict()
+    for name, (status_code, content) in zip(obs_names, results):
+        resp[name] = {'status_code': status_code, 'response': content}
+    logger.info(f'Bulk command by user {user_id}: '
+                f'{sum(result[0] == 200 for result in results)} of {len(results)} stands succeeded')
+    return resp
+
+
+@app.post('/bulk_start_stream')
+async def bulk_start_stream(request_body: BulkStartStreamModel):
+    """
+    Запускает стримы на нескольких стендах пользователя одновременно,
+    у каждого стенда свой ключ. Возвращает результат по каждому стенду
+    # {"user_id": "123", "stands": [{"obs_name": "obs_0", "key": "1234", "youtube_server": "rtmp://..."}]}
+    :param request_body:
+    :return:
+    """
+    stands = {stand.obs_name: stand for stand in request_body.stands}
+
+    async def command(name, obsclient, deadline):
+        return await run_output_batch(
+            start_stream_batch(obsclient, stands[name].key, stands[name].youtube_server, deadline=deadline),
+            OUTPUT_RUNNING, 'Obs stand with this ip currently in use', {'response': "started stream successfully"})
+
+    return JSONResponse(content=await run_bulk(request_body.user_id, list(stands), command))
+
+
+@app.post('/bulk_stop_stream')
+async def bulk_stop_stream(request_body: BulkStandsModel):
+    """
+    Останавливает стримы на нескольких стендах пользователя одновременно
+    # {"user_id": "123", "obs_names": ["obs_0", "obs_1"]}
+    :param request_body:
+    :return:
+    """
+    async def command(name, obsclient, deadline):
+        return await run_output_batch(
+            stop_stream_batch(obsclient, deadline=deadline),
+            OUTPUT_NOT_RUNNING, {'response': "Stream not running"}, {'response': "stopped successfully"})
+
+    return JSONResponse(content=await run_bulk(request_body.user_id, request_body.obs_names, command))
+
+
+@app.post('/bulk_start_recording')
+async def bulk_start_recording(request_body: BulkStandsModel):
+    """
+    Запускает запись на нескольких стендах пользователя одновременно
+    # {"user_id": "123", "obs_names": ["obs_0", "obs_1"]}
+    :param request_body:
+    :return:
+    """
+    async def command(name, obsclient, deadline):
+        return await run_output_batch(
+            start_recording_batch(obsclient, deadline=deadline),
+            OUTPUT_RUNNING, 'Obs stand with this ip currently in use', {'response': "started recording successfully"})
+
+    return JSONResponse(content=await run_bulk(request_body.user_id, request_body.obs_names, command))
+
+
+@app.post('/bulk_stop_recording')
+async def bulk_stop_recording(request_body: BulkStandsModel):
+    """
+    Останавливает запись на нескольких стендах пользователя одновременно
+    # {"user_id": "123", "obs_names": ["obs_0", "obs_1"]}
+    :param request_body:
+    :return:
+    """
+    async def command(name, obsclient, deadline):
+        return await run_output_batch(
+            stop_recording_batch(obsclient, deadline=deadline),
+            OUTPUT_NOT_RUNNING, 'The recording is not running', {'response': "stopped recording successfully"})
+
+    return JSONResponse(content=await run_bulk(request_body.user_id, request_body.obs_names, command))
 
 
 @app.get('/ping_redis')
@@ -169,11 +321,85 @@ async def ping():
     return {'server': 'OK!'}
 
 
+@app.get('/ready')
+async def ready():
+    """
+    Endpoint для проверки готовности сервиса принимать запросы (в отличие от /ping):
+    база доступна и сессии со стендами прогреты после старта. Пока нет -- 503
+    :return:
+    """
+    try:
+        await conductor.ping_db()
+        db_ok = True
+    except Exception as err:
+        logger.info(f'Database is not ready: {err}')
+        db_ok = False
+    content = {'ready': db_ok and warm_up.ready, 'database': db_ok, **warm_up.to_dict()}
+    return JSONResponse(status_code=200 if content['ready'] else 503, content=content)
+
+
+@app.get('/obs_circuits')
+async def obs_circuits():
+    """
+    Состояние circuit breaker'ов стендов: {'ip:port': {'state': ..., 'failures': ..., 'opened_at': ...}}
+    :return:
+    """
+    return JSONResponse(content=connection_manager.circuit_breakers.states())
+
+
+@app.get('/obs_queues')
+async def obs_queues():
+    """
+    Очереди команд стендов, у которых сейчас есть команды: {'ip:port': {'depth': ...,
+    'processed': ..., 'last_wait_ms': ..., 'max_wait_ms': ..., 'mean_wait_ms': ...}}
+    :return:
+    """
+    return JSONResponse(content=stand_commands.stats())
+
+
+@app.get('/response_cache')
+async def response_cache_stats():
+    """
+    Кэш ответов читающих эндпоинтов: {'entries': ..., 'hits': ..., 'misses': ..., 'hit_rate': ...,
+    'evictions': ..., 'invalidations': ...}
+    :return:
+    """
+    return JSONResponse(content=response_cache.stats())
+
+
+def stands_tags(added_obs) -> list:
+    return [stand_tag(ip, port) for name, ip, port in added_obs]
+
+
+def changed_stand_tags(obs_info, field_to_change: str, new_value) -> list:
+    """
+    Теги кэша стенда до изменения и, если меняется адрес, после него
+    """
+    if not obs_info:
+        return []
+    ip, port = obs_info[0], obs_info[1]
+    tags = [stand_tag(ip, port)]
+    if field_to_change == 'ip':
+        tags.append(stand_tag(new_value, port))
+    elif field_to_change == 'port':
+        tags.append(stand_tag(ip, new_value))
+    return tags
+
+
+async def invalidate_group(group_id: str, *tags: str):
+    """
+    Сбрасывает кэш группы и всех её участников: групповые стенды есть и в их личных списках
+    """
+    members = await db.get_group_members(group_id)
+    response_cache.invalidate(group_tag(group_id), *(user_tag(user_id) for user_id in members), *tags)
+
+
 @app.post('/add_obs')
 async def add_obs(request_body: UsersAddObs):
     logger.info('Adding users obs stand')
     await conductor.add_users_obs(request_body.user_id, request_body.obs_name,
                                   request_body.ip, request_body.port, request_body.password)
+    response_cache.invalidate(user_tag(request_body.user_id))
     logger.info(f'Added obs with ip {request_body.ip} for {request_body.user_id} in database')
     return JSONResponse(content={'text': 'Operation succeed'})
 
@@ -181,8 +407,12 @@ async def add_obs(request_body: UsersAddObs):
 @app.post('/edit_obs')
 async def edit_obs(request_body: UsersEditObs):
     logger.info('Editing users obs stand')
+    # запись в obs общая у всех, кому добавлен стенд, поэтому сбрасываем и ответы с этим стендом
+    obs_info = await db.get_obs_info(request_body.user_id, request_body.obs_name)
     await conductor.edit_users_obs(request_body.user_id, request_body.obs_name,
                                    request_body.field_to_change, request_body.new_value)
+    response_cache.invalidate(user_tag(request_body.user_id),
+                              *changed_stand_tags(obs_info, request_body.field_to_change, request_body.new_value))
     logger.info(f'Changed {request_body.field_to_change} for obs {request_body.obs_name}')
     return JSONResponse(content={'text': 'Operation succeed'})
 
@@ -190,10 +420,13 @@ async def edit_obs(request_body: UsersEditObs):
 @app.post('/edit_group_obs')
 async def edit_group_obs(request_body: EditGroupObs):
     logger.info('Editing group obs stand')
-    await conductor.edit_groups_obs(request_body.group_id, request_body.obs_name, request_body.field_to_change,
-                                    request_body.new_value)
-    logger.info(f'Changed {request_body.field_to_change} for obs {request_body.obs_name}')
-    return JSONResponse(content={'text': 'Operation succeed'})
+    obs_info = await db.get_group_obs_info(request_body.group_id, request_body.obs_name)
+    updated = await conductor.edit_groups_obs(request_body.group_id, request_body.obs_name,
+                                              request_body.field_to_change, request_body.new_value)
+    await invalidate_group(request_body.group_id,
+                           *changed_stand_tags(obs_info, request_body.field_to_change, request_body.new_value))
+    logger.info(f'Changed {request_body.field_to_change} for obs {request_body.obs_name}: {updated}')
+    return JSONResponse(content={'text': 'Operation succeed', 'updated': updated})
 
 
 @app.post('/raise_to_admin')
@@ -216,6 +449,7 @@ async def raise_to_admin(request_body: DeleteGroupMember):
 async def delete_obs(request_body: UserDelObs):
     logger.info('Deleting users obs stand')
     await conductor.del_users_obs(request_body.user_id, request_body.obs_name)
+    response_cache.invalidate(user_tag(request_body.user_id))
     logger.info(f'Deleted obs with ip {request_body.obs_name} for user {request_body.user_id} in database')
     return JSONResponse(content={'text': 'Operation succeed'})
 
@@ -223,54 +457,100 @@ async def delete_obs(request_body: UserDelObs):
 @app.delete('/delete_group_obs')
 async def delete_groups_obs(request_body: DeleteGroupObs):
     logger.info('Deleting obs stand')
-    deleted_obs_ip = await conductor.del_groups_obs(request_body.group_id, request_body.obs_name)
-    logger.info(f'Deleted obs with ip {deleted_obs_ip} for group {request_body.group_id} in database')
-    return JSONResponse(content={'text': 'Operation succeed'})
+    obs_info = await db.get_group_obs_info(request_body.group_id, request_body.obs_name)
+    deleted_obs_id, affected_members = await conductor.del_groups_obs(request_body.group_id, request_body.obs_name)
+    await invalidate_group(request_body.group_id, *changed_stand_tags(obs_info, None, None))
+    logger.info(f'Deleted obs {deleted_obs_id} for group {request_body.group_id} '
+                f'and {affected_members} members in database')
+    return JSONResponse(content={'text': 'Operation succeed', 'affected_members': affected_members})
+
+
+async def probe_stand(user_id: str, name: str, ip, port, deadline: Deadline) -> dict:
+    """
+    Проверяет доступность одного стенда и статусы стрима и записи на нём.
+    Если стенд не ответил за OBS_PROBE_CONFIG['timeout'] секунд, он считается недоступным
+    """
+    stand_deadline = deadline.child(OBS_PROBE_CONFIG['timeout'])
+
+    async def probe():
+        # недоступные по данным фоновой проверки стенды не ждём
+        cached = health_monitor.availability(stand_key(ip, port))
+        if cached is not None and not cached.available:
+            return {'availability': False, 'checked_at': cached.checked_at}
+        obsclient = await conductor.get_obs_client(user_id, name)
+        if not await ping_obs(obsclient, deadline=stand_deadline):
+            return {'availability': False}
+        stream_status = await ping_stream(obsclient, deadline=stand_deadline)
+        recording_status = await ping_recording(obsclient, deadline=stand_deadline)
+        return {'availability': True, "stream_status": stream_status,
+                "recording_status": recording_status,
+                "updated_at": stand_states.state(client_key(obsclient)).updated_at}
+
+    try:
+        result = await asyncio.wait_for(probe(), timeout=max(0, stand_deadline.remaining()))
+    except (asyncio.TimeoutError, DeadlineExceeded):
+        logger.info(f'Obs {name} of user {user_id} did not answer in time')
+        result = {'availability': False}
+    result['latency_ms'] = stand_deadline.elapsed_ms()
+    return {'ip': ip, 'port': port, **result}
+
+
+def list_obs(added_obs) -> dict:
+    content = dict()  # словарь {'имя обс': {параметры}, 'имя обс-2': {параметры-2}, ...}
+    for obs in added_obs:
+        obs_name = obs[0]
+        ip = obs[1]
+        port = obs[2]
+        content[obs_name] = {'ip': ip, 'port': port}
+    return content
 
 
 @app.get('/check_obs')
 async def check_obs(request_body: CheckObs):
-    added_obs = await conductor.get_users_obs(request_body.user_id)
     need_availability = request_body.need_availability
+    if not need_availability:  # без проверки доступности ответ берётся из кэша
+        async def load():
+            added_obs = await conductor.get_users_obs(request_body.user_id)
+            return {'content': list_obs(added_obs), 'tags': stands_tags(added_obs)}
+
+        cached = await response_cache.get_or_load(('check_obs', request_body.user_id), load,
+                                                  lambda value: [user_tag(request_body.user_id), *value['tags']])
+        return JSONResponse(content=cached['content'])
+
+    added_obs = await conductor.get_users_obs(request_body.user_id)
     resp = dict()  # словарь {'имя обс': {параметры}, 'имя обс-2': {параметры-2}, ...}
-    for obs in added_obs:
-        name = obs[0]
-        ip = obs[1]
-        port = obs[2]
-        obsclient = await conductor.get_obs_client(request_body.user_id, name)
-        if need_availability:  # для доступных ОБС также смотрим, идёт ли на них стрим и запись
-            availability = await ping_obs(obsclient)
-            if availability:
-                stream_status = await ping_stream(obsclient)
-                recording_status = await ping_recording(obsclient)
-                resp[name] = {'ip': ip, 'port': port, 'availability': availability, "stream_status": stream_status,
-                              "recording_status": recording_status}
-            else:
-                resp[name] = {'ip': ip, 'port': port, 'availability': availability}
-        else:
-            resp[name] = {'ip': ip, 'port': port}
+    # для доступных ОБС также смотрим, идёт ли на них стрим и запись;
+    # все стенды проверяются параллельно, ответ приходит за время самого медленного
+    deadline = Deadline()
+    results = await run_bounded(lambda obs: probe_stand(request_body.user_id, *obs, deadline), added_obs,
+                                OBS_PROBE_CONFIG['concurrency'])
+    for obs, result in zip(added_obs, results):
+        resp[obs[0]] = result
 
     return JSONResponse(content=resp)
 
 
 @app.get('/check_group_obs')
 async def check_group_obs(request_body: CheckGroupObs):
-    added_obs = await conductor.get_groups_obs(request_body.group_id)
-    content = dict()  # словарь {'имя обс': {параметры}, 'имя обс-2': {параметры-2}, ...}
-    for obs in added_obs:
-        obs_name = obs[0]
-        ip = obs[1]
-        port = obs[2]
-        content[obs_name] = {'ip': ip, 'port': port}
+    async def load():
+        added_obs = await conductor.get_groups_obs(request_body.group_id)
+        return {'content': list_obs(added_obs), 'tags': stands_tags(added_obs)}
 
-    return JSONResponse(content=content)
+    cached = await response_cache.get_or_load(('check_group_obs', request_body.group_id), load,
+                                              lambda value: [group_tag(request_body.group_id), *value['tags']])
+    return JSONResponse(content=cached['content'])
 
 
 @app.get('/check_obs_groups')
 async def check_obs_group(request_body: CheckObsGroups):
-    ip, port, password = await db.get_obs_info(request_body.user_id, request_body.obs_name)
-    groups = await db.find_obs_groups(ip, port)
-    return JSONResponse(content=groups)
+    async def load():
+        ip, port, password = await db.get_obs_info(request_body.user_id, request_body.obs_name)
+        groups = await db.find_obs_groups(ip, port)
+        return {'content': groups, 'tags': [stand_tag(ip, port), *(group_tag(group) for group in groups)]}
+
+    cached = await response_cache.get_or_load(('check_obs_groups', request_body.user_id, request_body.obs_name),
+                                              load, lambda value: [user_tag(request_body.user_id), *value['tags']])
+    return JSONResponse(content=cached['content'])
 
 
 @app.post('/add_group')
@@ -291,16 +571,34 @@ async def add_group_member(request_body: AddGroupMember):
     """
     logger.info('Adding group member')
     await conductor.add_groups_user(request_body.group_id, request_body.user_id, request_body.is_admin)
+    response_cache.invalidate(user_tag(request_body.user_id))
     logger.info(f'Added member {request_body.user_id} to group {request_body.group_id}')
     return JSONResponse(content={'group_id': request_body.group_id})
 
 
+@app.post('/add_group_members')
+async def add_group_members(request_body: AddGroupMembers):
+    """
+    Добавляет в группу сразу много участников: незарегистрированные пользователи создаются,
+    новые участники получают все стенды группы
+    # {"group_id": "-100123", "members": [{"user_id": "1", "is_admin": true}, {"user_id": "2"}]}
+    :return: {'group_id': ..., 'added': [новые участники], 'existing': [уже были в группе]}
+    """
+    logger.info('Adding group members')
+    added, existing = await conductor.add_groups_users(
+        request_body.group_id, [(member.user_id, member.is_admin) for member in request_body.members])
+    response_cache.invalidate(*(user_tag(user_id) for user_id in added))
+    logger.info(f'Added {len(added)} members to group {request_body.group_id}')
+    return JSONResponse(content={'group_id': request_body.group_id, 'added': added, 'existing': existing})
+
+
 @app.delete('/delete_group_member')
 async def delete_group_member(request_body: DeleteGroupMember):
     """
     Удаляет участника из группы
     """
     await conductor.del_group_user(request_body.group_id, request_body.user_id)
+    response_cache.invalidate(user_tag(request_body.user_id))
     logger.info(f'Deleting member {request_body.user_id} from group {request_body.group_id}')
     return JSONResponse(content={'group_id': request_body.group_id})
 
@@ -310,43 +608,77 @@ async def add_obs(request_body: UsersAddObs):
     logger.info('Adding users obs stand')
     await conductor.add_users_obs(request_body.user_id, request_body.obs_name,
                                   request_body.ip, request_body.port, request_body.password)
+    response_cache.invalidate(user_tag(request_body.user_id))
     logger.info(f'Added obs with ip {request_body.ip} for {request_body.user_id} in database')
     return JSONResponse(content={'text': 'Operation succeed'})
 
 
 @app.post('/add_group_obs')
 async def add_group_obs(request_body: AddGroupObs):
-    content = {"added": [], "missed": []}
+    """
+    Добавляет стенды админа в группу и всем её участникам.
+    В skipped_members по каждому стенду — участники, у которых уже был стенд с таким именем или адресом
+    """
+    await conductor.check_group_in_db(request_body.group_id)
+    await conductor.check_user_in_db(request_body.admin_id)
+    content = {"added": [], "missed": [], "skipped_members": {}}
     for obs_name in request_body.obs_names:
-        # Если ОБС найдена и добавлена, то added=True
-        added = await conductor.add_groups_obs(request_body.group_id, request_body.admin_id, obs_name)
-        if added:
-            content["added"].append(obs_name)
-        else:
+        try:
+            result = await conductor.add_groups_obs(request_body.group_id, request_body.admin_id, obs_name)
+        except HTTPException as err:  # стенд не найден у админа или уже есть в группе
+            logger.info(f'Obs {obs_name} was not added to group {request_body.group_id}: {err.detail}')
             content["missed"].append(obs_name)
+            continue
+        content["added"].append(obs_name)
+        content["skipped_members"][obs_name] = result['skipped_members']
+    # группы стенда меняются и в /check_obs_groups всех, у кого он есть
+    stands = [await db.get_obs_info(request_body.admin_id, obs_name) for obs_name in content["added"]]
+    await invalidate_group(request_body.group_id, *(stand_tag(obs[0], obs[1]) for obs in stands if obs))
     return JSONResponse(content=content)
 
 
 @app.get('/ping_obs')
 async def ping_obs_handler(request_body: UserPingStreamObs):
+    deadline = Deadline()
     obs_client = await conductor.get_obs_client(request_body.user_id, request_body.obs_name)
-    if await ping_obs(obs_client):
+    cached = health_monitor.availability(client_key(obs_client))
+    if cached is not None:  # результат фоновой проверки ещё актуален
+        available = cached.available
+    else:
+        available = await ping_obs(obs_client, deadline=deadline)
+    if available:
         return JSONResponse(content={'text': 'Obs stand is available'})
     return JSONResponse(status_code=451,
                         content={'text': 'Obs stand is unavailable'})
 
 
+@app.get('/obs_stats')
+async def obs_stats_handler(request_body: ObsStatsModel):
+    """
+    Статистика стенда (GetStats) за последние window секунд по данным фоновых
+    проверок: min, max и среднее по каждой метрике и ряд из не более чем points точек
+    # {"user_id": "123", "obs_name": "obs_0", "window": 600, "points": 60}
+    :param request_body:
+    :return:
+    """
+    ip, port, password = await conductor.get_obs_info(request_body.user_id, request_body.obs_name)
+    summary = stand_telemetry.summary(stand_key(ip, port), request_body.window, request_body.points)
+    return JSONResponse(content=summary)
+
+
 @app.get('/ping_stream')
 async def ping_stream_handler(request_body: UserPingStreamObs):
     """
     Endpoint для проверки, работает ли стрим
     :return:
     """
+    deadline = Deadline()
     obs_client = await conductor.get_obs_client(request_body.user_id, request_body.obs_name)
-    if await ping_obs(obs_client):
-        if await ping_stream(obs_client):
-            time = str(await stream_time(obs_client))
-            return JSONResponse(content={'text': 'Stream on obs is running', 'stream_time': time})
+    if await ping_obs(obs_client, deadline=deadline):
+        if await ping_stream(obs_client, deadline=deadline):
+            time = str(await stream_time(obs_client, deadline=deadline))
+            return JSONResponse(content={'text': 'Stream on obs is running', 'stream_time': time,
+                                         'updated_at': stand_states.state(client_key(obs_client)).updated_at})
         return JSONResponse(status_code=451,
                             content={'text': 'Stream on obs in not running'})
     else:
@@ -354,18 +686,36 @@ async def ping_stream_handler(request_body: UserPingStreamObs):
                             content={'text': 'OBS is not available'})
 
 
+@app.get('/stream_quality')
+async def stream_quality_handler(request_body: UserPingStreamObs):
+    """
+    Качество идущего стрима: битрейт, доля пропущенных кадров, перегрузка канала
+    и сработавшие предупреждения
+    # {"user_id": "123", "obs_name": "obs_0"}
+    :return:
+    """
+    ip, port, password = await conductor.get_obs_info(request_body.user_id, request_body.obs_name)
+    quality = stream_monitor.quality(stand_key(ip, port))
+    if quality is None:
+        return JSONResponse(status_code=451,
+                            content={'text': 'Stream on obs in not running'})
+    return JSONResponse(content=quality.to_dict())
+
+
 @app.get('/ping_recording')
 async def ping_recording_handler(request_body: UserPingStreamObs):
     """
     Endpoint для проверки, работает ли запись
     :return:
     """
+    deadline = Deadline()
     obs_client = await conductor.get_obs_client(request_body.user_id, request_body.obs_name)
-    if await ping_obs(obs_client):
-        if await ping_recording(obs_client):
-            time = str(await recording_time(obs_client))
+    if await ping_obs(obs_client, deadline=deadline):
+        if await ping_recording(obs_client, deadline=deadline):
+            time = str(await recording_time(obs_client, deadline=deadline))
             logger.info(time)
-            return JSONResponse(content={'text': 'Recording on obs is running', 'recording_time': time})
+            return JSONResponse(content={'text': 'Recording on obs is running', 'recording_time': time,
+                                         'updated_at': stand_states.state(client_key(obs_client)).updated_at})
         return JSONResponse(status_code=451,
                             content={'text': 'Recording on obs in not running'})
     else:
@@ -397,14 +747,11 @@ async def start_stream_calendar(calendar_data: CalendarData):
     :param calendar_data:
     :return:
     """
+    deadline = Deadline()
     obsclient = config_obsclient_calendar(calendar_data)
-    await stop_stream(obsclient)
-    await set_stream_parameters(obsclient,
-                                calendar_data.stream_key,
-                                calendar_data.youtube_server)
     await start_youtube_stream(obsclient,
                                calendar_data.stream_key,
-                               calendar_data.youtube_server)
+                               calendar_data.youtube_server, deadline=deadline)
     return JSONResponse(content={'response': "started stream successfully"})
 
 
@@ -419,8 +766,9 @@ async def stop_stream_calendar(calendar_data: CalendarDataStop):
     :param calendar_data:
     :return:
     """
+    deadline = Deadline()
     obsclient = config_obsclient_calendar(calendar_data)
-    await stop_youtube_stream(obsclient)
+    await stop_youtube_stream(obsclient, deadline=deadline)
     return JSONResponse(content={'response': "stopped successfully"})
 
 
@@ -432,9 +780,15 @@ async def get_obs_info_handler(request_body: UserObs):
     :param request_body:
     :return:
     """
-    ip, port, password = await db.get_obs_info(request_body.user_id,
-                                               request_body.obs_name)
-    return JSONResponse(content={'ip': ip, 'port': port, 'password': password})
+    async def load():
+        ip, port, password = await db.get_obs_info(request_body.user_id,
+                                                   request_body.obs_name)
+        return {'ip': ip, 'port': port, 'password': password}
+
+    content = await response_cache.get_or_load(('get_obs_info', request_body.user_id, request_body.obs_name), load,
+                                               lambda value: [user_tag(request_body.user_id),
+                                                              stand_tag(value['ip'], value['port'])])
+    return JSONResponse(content=content)
 
 
 @app.get('/set_scene')
@@ -444,16 +798,17 @@ async def set_scene_handler(request_body: SetSceneModel):
     :param request_body:
     :return:
     """
+    deadline = Deadline()
     obsclient = await conductor.get_obs_client(request_body.user_id, request_body.obs_name)
-    if not await ping_obs(obsclient):
+    if not await ping_obs(obsclient, deadline=deadline):
         return JSONResponse(status_code=409,
                             content='Obs stand is unavailable')
 
-    if str(request_body.scene_name) not in str(await (get_scenes(obsclient))):
+    if not await scene_exists(obsclient, request_body.scene_name, deadline=deadline):
         return JSONResponse(status_code=404,
                             content='There is no such scene')
 
-    await set_scene(obsclient, request_body.scene_name)
+    await set_scene(obsclient, request_body.scene_name, deadline=deadline)
 
     return JSONResponse(content='The current scene is changed')
 
@@ -468,11 +823,134 @@ async def get_scenes_handler(request_body: GetScenesModel):
     :param request_body:
     :return:
     """
+    deadline = Deadline()
     obsclient = await conductor.get_obs_client(request_body.user_id, request_body.obs_name)
-    if not await ping_obs(obsclient):
+    if not await ping_obs(obsclient, deadline=deadline):
         return JSONResponse(status_code=409,
                             content='Obs stand is unavailable')
 
-    scenes_info = await get_scenes(obsclient)
+    scenes_info = await get_scenes(obsclient, deadline=deadline)
 
     return JSONResponse(content=scenes_info)
+
+
+@app.get('/get_preview')
+async def get_preview_handler(request_body: PreviewModel, if_none_match: str = Header(None)):
+    """
+    Возвращает JPEG текущей Program сцены стенда. Снимок кэшируется на
+    несколько секунд и общий для всех зрителей; если у клиента уже есть
+    этот снимок (If-None-Match совпадает с ETag), отдаём 304 без тела
+    # {"user_id": "123", "obs_name": "obs_0"}
+    :param request_body:
+    :param if_none_match:
+    :return:
+    """
+    deadline = Deadline()
+    obsclient = await conductor.get_obs_client(request_body.user_id, request_body.obs_name)
+    try:
+        preview = await preview_cache.get(obsclient, deadline=deadline)
+    except ObsConnectionError:
+        return JSONResponse(status_code=409,
+                            content='Obs stand is unavailable')
+    if preview is None:
+        return JSONResponse(status_code=500,
+                            content='Obs could not take a screenshot')
+
+    headers = preview.headers(OBS_PREVIEW_CONFIG['ttl'])  # имя сцены в X-Scene-Name закодировано в %XX
+    if if_none_match is not None and preview.etag in [tag.strip() for tag in if_none_match.split(',')]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=preview.image, media_type='image/jpeg', headers=headers)
+
+
+def stand_snapshot(obsclient) -> dict:
+    key = client_key(obsclient)
+    return {'availability': connection_manager.is_identified(key), **stand_states.state(key).to_dict()}
+
+
+async def subscribe_stand(obsclient, deadline: Deadline):
+    """
+    Открывает сессию со стендом (после этого его состояние обновляется по событиям OBS)
+    и заполняет кэш состояния. Недоступный стенд просто останется без состояния
+    """
+    stand_deadline = deadline.child(OBS_PROBE_CONFIG['timeout'])
+    try:
+        if await ping_obs(obsclient, deadline=stand_deadline):
+            await ping_stream(obsclient, deadline=stand_deadline)
+            await ping_recording(obsclient, deadline=stand_deadline)
+    except (ObsConnectionError, DeadlineExceeded) as err:
+        logger.info(f'Could not subscribe to OBS {client_key(obsclient)}: {err}')
+
+
+@app.websocket('/stand_states')
+async def stand_states_ws(websocket: WebSocket):
+    """
+    Push-канал состояния стендов вместо опроса /ping_stream и /ping_recording.
+    Клиент первым сообщением присылает {"user_id": "123"} или {"group_id": "abc"},
+    получает снимок {"type": "snapshot", "stands": {"имя обс": {...}}}, а дальше
+    {"type": "delta", "obs_name": ..., "stream_status": ..., ...} при каждом изменении,
+    как только OBS присылает событие
+    """
+    await websocket.accept()
+    try:
+        request = await websocket.receive_json()
+        if 'group_id' in request:
+            clients = await conductor.get_group_obs_clients(request['group_id'])
+        else:
+            names = [obs[0] for obs in await conductor.get_users_obs(request['user_id'])]
+            clients = await conductor.get_obs_clients(request['user_id'], names)
+    except WebSocketDisconnect:
+        return
+    except ValueError:  # первое сообщение не JSON
+        await websocket.close(code=status.WS_1003_UNSUPPORTED_DATA)
+        return
+    except (KeyError, TypeError):  # в запросе нет ни user_id, ни group_id
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    except HTTPException as err:
+        await websocket.send_json({'type': 'error', 'status_code': err.status_code, 'detail': err.detail})
+        await websocket.close()
+        return
+
+    names_by_key = dict()  # один и тот же стенд может быть добавлен под разными именами
+    for name, obsclient in clients.items():
+        names_by_key.setdefault(client_key(obsclient), []).append(name)
+    changed = asyncio.Queue()
+
+    def on_change(key, state):
+        if key in names_by_key:
+            changed.put_nowait(key)
+
+    stand_states.add_listener(on_change)
+    receiver = None
+    try:
+        deadline = Deadline()
+        await run_bounded(lambda obsclient: subscribe_stand(obsclient, deadline), list(clients.values()),
+                          OBS_PROBE_CONFIG['concurrency'])
+        # изменения, накопившиеся при подписке, уже есть в снимке
+        while not changed.empty():
+            changed.get_nowait()
+        await websocket.send_json({'type': 'snapshot',
+                                   'stands': {name: stand_snapshot(obsclient) for name, obsclient in clients.items()}})
+        # сообщения клиента после подписки не нужны, читаем их только чтобы заметить отключение
+        receiver = asyncio.ensure_future(websocket.receive_text())
+        while True:
+            getter = asyncio.ensure_future(changed.get())
+            done, _ = await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                key = getter.result()
+                for name in names_by_key[key]:
+                    await websocket.send_json({'type': 'delta', 'obs_name': name,
+                                               **stand_snapshot(clients[name])})
+            else:
+                getter.cancel()
+            if receiver in done:
+                receiver.result()  # WebSocketDisconnect, если клиент ушёл
+                receiver = asyncio.ensure_future(websocket.receive_text())
+    except WebSocketDisconnect:
+        logger.info(f'Stand states subscriber {request} disconnected')
+    except Exception as err:  # отправка в уже закрытый сокет
+        logger.info(f'Stand states subscriber {request} dropped: {err}')
+    finally:
+        stand_states.remove_listener(on_change)
+        if receiver is not None:
+            receiver.cancel()
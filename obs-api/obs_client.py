@@ -0,0 +1,213 @@
+import asyncio
+import base64
+import hashlib
+import inspect
+import itertools
+import json
+
+import websockets
+from loguru import logger
+# типы запросов и ответов те же, что у simpleobsws: клиенты взаимозаменяемы в obs_functions
+from simpleobsws import IdentificationParameters, Request, RequestResponse, RequestStatus, \
+    RequestBatchExecutionType, MessageTimeout, EventRegistrationError, NotIdentifiedError
+
+try:
+    import msgpack
+except ImportError:  # без msgpack работаем только с JSON
+    msgpack = None
+
+RPC_VERSION = 1
+MSGPACK_SUBPROTOCOL = 'obswebsocket.msgpack'
+JSON_SUBPROTOCOL = 'obswebsocket.json'
+
+
+class ObsClient:
+    """
+    Async obs-websocket v5 client with the interface of simpleobsws.WebSocketClient.
+    Negotiates the obswebsocket.msgpack subprotocol when msgpack is installed
+    (binary frames, no JSON encoding) and falls back to obswebsocket.json.
+    Requests are multiplexed on one connection by requestId.
+    """
+
+    def __init__(self, url: str = 'ws://localhost:4455', password: str = '',
+                 identification_parameters: IdentificationParameters = None, use_msgpack: bool = True):
+        self.url = url
+        self.password = password
+        self.identification_parameters = identification_parameters or IdentificationParameters()
+        self.use_msgpack = use_msgpack and msgpack is not None
+        self.ws = None
+        self.subprotocol = None
+        self.identified = False
+        self.event_callbacks = []
+        self._waiters = {}  # requestId -> Future с полем 'd' ответа
+        self._request_ids = itertools.count()
+        self._identified = asyncio.Event()
+        self._recv_task = None
+
+    async def connect(self) -> bool:
+        if self.ws is not None and self.ws.open:
+            return False
+        subprotocols = [MSGPACK_SUBPROTOCOL, JSON_SUBPROTOCOL] if self.use_msgpack else [JSON_SUBPROTOCOL]
+        self.identified = False
+        self._identified = asyncio.Event()
+        self.ws = await websockets.connect(self.url, subprotocols=subprotocols, max_size=2 ** 24)
+        self.subprotocol = self.ws.subprotocol or JSON_SUBPROTOCOL
+        self._recv_task = asyncio.get_event_loop().create_task(self._recv())
+        return True
+
+    async def wait_until_identified(self, timeout: float = 10) -> bool:
+        if self.ws is None or not self.ws.open:
+            return False
+        try:
+            await asyncio.wait_for(self._identified.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def disconnect(self) -> bool:
+        if self._recv_task is None:
+            return False
+        self._recv_task.cancel()
+        self._recv_task = None
+        await self.ws.close()
+        self.ws = None
+        self.identified = False
+        self._fail_waiters(ConnectionError('Disconnected from obs-websocket'))
+        return True
+
+    def register_event_callback(self, callback, event: str = None):
+        if not inspect.iscoroutinefunction(callback):
+            raise EventRegistrationError('Registered functions must be async')
+        self.event_callbacks.append((callback, event))
+
+    def deregister_event_callback(self, callback, event: str = None):
+        for registered, trigger in list(self.event_callbacks):
+            if registered == callback and (event is None or trigger == event):
+                self.event_callbacks.remove((registered, trigger))
+
+    def is_identified(self) -> bool:
+        return self.identified
+
+    async def call(self, request: Request, timeout: float = 15) -> RequestResponse:
+        payload = {'requestType': request.requestType}
+        if request.requestData is not None:
+            payload['requestData'] = request.requestData
+        response = await self._request(6, payload, timeout, f'The request with type {request.requestType}')
+        return self._build_request_response(response)
+
+    async def call_batch(self, requests: list, timeout: float = 15, halt_on_failure: bool = None,
+                         execution_type: RequestBatchExecutionType = None, variables: dict = None) -> list:
+        payload = {'requests': []}
+        if halt_on_failure is not None:
+            payload['haltOnFailure'] = halt_on_failure
+        if execution_type:
+            payload['executionType'] = execution_type.value
+        if variables:
+            payload['variables'] = variables
+        for request in requests:
+            request_payload = {'requestType': request.requestType}
+            if request.requestData is not None:
+                request_payload['requestData'] = request.requestData
+            if request.inputVariables:
+                request_payload['inputVariables'] = request.inputVariables
+            if request.outputVariables:
+                request_payload['outputVariables'] = request.outputVariables
+            payload['requests'].append(request_payload)
+        response = await self._request(8, payload, timeout, 'The request batch')
+        return [self._build_request_response(result) for result in response['results']]
+
+    async def _request(self, op: int, payload: dict, timeout: float, description: str) -> dict:
+        if not self.identified:
+            raise NotIdentifiedError('Calls to requests cannot be made without being identified with obs-websocket.')
+        request_id = str(next(self._request_ids))
+        payload['requestId'] = request_id
+        waiter = asyncio.get_event_loop().create_future()
+        self._waiters[request_id] = waiter
+        try:
+            await self._send({'op': op, 'd': payload})
+            return await asyncio.wait_for(waiter, timeout=timeout)
+        except asyncio.TimeoutError:
+            raise MessageTimeout(f'{description} timed out after {timeout} seconds.')
+        finally:
+            self._waiters.pop(request_id, None)
+
+    @staticmethod
+    def _build_request_response(response: dict) -> RequestResponse:
+        status = response['requestStatus']
+        return RequestResponse(response['requestType'],
+                               RequestStatus(status['result'], status['code'], status.get('comment')),
+                               response.get('responseData'))
+
+    def _encode(self, message: dict):
+        if self.subprotocol == MSGPACK_SUBPROTOCOL:
+            return msgpack.packb(message)
+        return json.dumps(message)
+
+    def _decode(self, message) -> dict:
+        if self.subprotocol == MSGPACK_SUBPROTOCOL:
+            return msgpack.unpackb(message, raw=False)
+        return json.loads(message)
+
+    async def _send(self, message: dict):
+        await self.ws.send(self._encode(message))
+
+    async def _identify(self, hello: dict):
+        identify = {'rpcVersion': RPC_VERSION}
+        if 'authentication' in hello:
+            secret = base64.b64encode(hashlib.sha256(
+                (self.password + hello['authentication']['salt']).encode('utf-8')).digest())
+            identify['authentication'] = base64.b64encode(hashlib.sha256(
+                secret + hello['authentication']['challenge'].encode('utf-8')).digest()).decode('utf-8')
+        if self.identification_parameters.ignoreNonFatalRequestChecks is not None:
+            identify['ignoreNonFatalRequestChecks'] = self.identification_parameters.ignoreNonFatalRequestChecks
+        if self.identification_parameters.eventSubscriptions is not None:
+            identify['eventSubscriptions'] = self.identification_parameters.eventSubscriptions
+        await self._send({'op': 1, 'd': identify})
+
+    def _dispatch_event(self, event: dict):
+        loop = asyncio.get_event_loop()
+        for callback, trigger in self.event_callbacks:
+            if trigger is None:
+                params = len(inspect.signature(callback).parameters)
+                if params == 1:
+                    loop.create_task(callback(event))
+                elif params == 2:
+                    loop.create_task(callback(event['eventType'], event.get('eventData')))
+                elif params == 3:
+                    loop.create_task(callback(event['eventType'], event.get('eventIntent'), event.get('eventData')))
+            elif trigger == event['eventType']:
+                loop.create_task(callback(event.get('eventData')))
+
+    def _fail_waiters(self, error: Exception):
+        for waiter in self._waiters.values():
+            if not waiter.done():
+                waiter.set_exception(error)
+        self._waiters.clear()
+
+    async def _recv(self):
+        ws = self.ws
+        try:
+            async for message in ws:
+                try:
+                    payload = self._decode(message)
+                except Exception as err:
+                    logger.debug(f'Could not decode obs-websocket message: {err}')
+                    continue
+                op, data = payload['op'], payload['d']
+                if op == 7 or op == 9:  # RequestResponse / RequestBatchResponse
+                    waiter = self._waiters.get(data['requestId'])
+                    if waiter is not None and not waiter.done():
+                        waiter.set_result(data)
+                elif op == 5:  # Event
+                    self._dispatch_event(data)
+                elif op == 0:  # Hello
+                    await self._identify(data)
+                elif op == 2:  # Identified
+                    self.identified = True
+                    self._identified.set()
+        except websockets.exceptions.ConnectionClosed as err:
+            logger.debug(f'obs-websocket connection {self.url} closed: {err}')
+        finally:
+            self.identified = False
+            # ожидающие запросы не ждут таймаута, если соединение уже закрыто
+            self._fail_waiters(ConnectionError(f'obs-websocket connection {self.url} closed'))
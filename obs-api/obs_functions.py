@@ -1,229 +1,359 @@
 import asyncio
+import base64
 from loguru import logger
 import simpleobsws
 import time
 
+from command_queue import stand_commands
+from deadline import Deadline, DeadlineExceeded
+from obs_sessions import connection_manager, client_key
+from obs_state import stand_states, format_timecode
+from scene_cache import scene_catalogs
+from singleflight import SingleFlight
 
-async def start_youtube_stream(obsclient: simpleobsws.WebSocketClient,
-                               key: str, youtube_server: str = None):
+
+# коды RequestStatus из obs-websocket v5, которыми OBS отвечает на
+# запуск уже идущего / остановку не идущего вывода
+OUTPUT_RUNNING = 500
+OUTPUT_NOT_RUNNING = 501
+
+# запросы только на чтение: одновременные одинаковые запросы к одному стенду
+# выполняются один раз, и все получают один и тот же ответ
+COALESCED_REQUESTS = {'GetStreamStatus', 'GetRecordStatus', 'GetSceneList', 'GetStats'}
+obs_reads = SingleFlight()
+
+# запросы, меняющие состояние стенда: к одному стенду они выполняются строго
+# по очереди (stand_commands), к разным -- параллельно
+MUTATING_REQUESTS = {'SetStreamServiceSettings', 'StartStream', 'StopStream', 'StartRecord', 'StopRecord',
+                     'SetCurrentProgramScene'}
+
+
+def stream_settings_request(key: str, youtube_server: str = None) -> simpleobsws.Request:
     """
-    Принимает объект класса simpleobsws.WebSocketClient (OBS) и
-    ключ трансляции. Начинает стрим на этой OBS с этим ключом
+    Собирает запрос SetStreamServiceSettings с ключом и сервером трансляции
     """
-
     if youtube_server is None:
         youtube_server = "rtmp://a.rtmp.youtube.com/live2"
-    await obsclient.connect()
-    await obsclient.wait_until_identified()
+    return simpleobsws.Request('SetStreamServiceSettings',
+                               requestData={
+                                   "streamServiceSettings":
+                                       {"bwtest": False,
+                                        "key": key,
+                                        "server": youtube_server,
+                                        "service": "YouTube - RTMPS"},
+                                   "streamServiceType": "rtmp_common"})
+
+
+async def obs_call(obsclient: simpleobsws.WebSocketClient, request: simpleobsws.Request,
+                   deadline: Deadline = None) -> simpleobsws.RequestResponse:
+    """
+    Отправляет один запрос через сессию из пула. Подключение, опознание и сам
+    запрос укладываются в дедлайн deadline. Одновременные одинаковые запросы
+    из COALESCED_REQUESTS к одному стенду разделяют один вызов
+    """
+    if deadline is None:
+        deadline = Deadline()
+    if request.requestType in COALESCED_REQUESTS and not request.requestData:
+        key = (client_key(obsclient), request.requestType)
+        # общий вызов идёт со своим полным бюджетом, а каждый ждёт его не дольше своего дедлайна:
+        # короткий бюджет первого вызвавшего не должен обрывать запрос остальным
+        try:
+            return await obs_reads.do(key, lambda: _obs_call(obsclient, request, Deadline()),
+                                      timeout=max(0, deadline.remaining()))
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded('request', deadline)
+        except DeadlineExceeded as err:
+            raise DeadlineExceeded(err.phase, deadline)
+    if request.requestType in MUTATING_REQUESTS:
+        return await _in_stand_queue(obsclient, lambda: _obs_call(obsclient, request, deadline), deadline)
+    return await _obs_call(obsclient, request, deadline)
+
+
+async def _in_stand_queue(obsclient: simpleobsws.WebSocketClient, factory, deadline: Deadline):
+    """
+    Выполняет команду в очереди команд стенда; ожидание очереди тоже входит в дедлайн
+    """
+    try:
+        return await stand_commands.run(client_key(obsclient), factory, timeout=max(0, deadline.remaining()))
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded('queue', deadline)
 
-    # установим нужные настройки стрима:
-    request = simpleobsws.Request('SetStreamServiceSettings',
-                                  requestData={
-                                      "streamServiceSettings":
-                                          {"bwtest": False,
-                                           "key": key,
-                                           "server": youtube_server,
-                                           "service": "YouTube - RTMPS"},
-                                      "streamServiceType": "rtmp_common"})
-
-    ret = await obsclient.call(request)  # отправляем запрос
-    if ret.ok():  # проверка
-        logger.info("Request 'start stream' succeeded!")
 
-    request = simpleobsws.Request('StartStream')  # запрос "начать стрим"
-    ret = await obsclient.call(request)  # запускаем его
-    if ret.ok():  # проверка
-        logger.info("Request 'start stream' succeeded!")
+async def _obs_call(obsclient: simpleobsws.WebSocketClient, request: simpleobsws.Request,
+                    deadline: Deadline) -> simpleobsws.RequestResponse:
+    async with connection_manager.lease(obsclient, deadline) as client:
+        return await deadline.run('request', client.call(request))
+
+
+async def call_batch(obsclient: simpleobsws.WebSocketClient, requests: list,
+                     halt_on_failure: bool = True, deadline: Deadline = None) -> list:
+    """
+    Отправляет список запросов одним сообщением RequestBatch (один сетевой
+    round trip). При halt_on_failure OBS прекращает выполнение на первом
+    неудачном запросе, и в ответе будут только выполненные запросы.
+    Пачка с меняющими состояние запросами выполняется в очереди команд стенда
+    """
+    if deadline is None:
+        deadline = Deadline()
+    if any(request.requestType in MUTATING_REQUESTS for request in requests):
+        return await _in_stand_queue(obsclient, lambda: _call_batch(obsclient, requests, halt_on_failure, deadline),
+                                     deadline)
+    return await _call_batch(obsclient, requests, halt_on_failure, deadline)
 
-    await obsclient.disconnect()
 
+async def _call_batch(obsclient: simpleobsws.WebSocketClient, requests: list,
+                      halt_on_failure: bool, deadline: Deadline) -> list:
+    async with connection_manager.lease(obsclient, deadline) as client:
+        return await deadline.run('request', client.call_batch(
+            requests, halt_on_failure=halt_on_failure,
+            execution_type=simpleobsws.RequestBatchExecutionType.SerialRealtime))
 
-async def stop_youtube_stream(obsclient: simpleobsws.WebSocketClient):
+
+def batch_failure(results: list):
+    """
+    Возвращает первый неудачный ответ из пачки или None, если все запросы прошли
+    """
+    for ret in results:
+        if not ret.ok():
+            logger.info(f"Request '{ret.requestType}' failed with code "
+                        f"{ret.requestStatus.code}: {ret.requestStatus.comment}")
+            return ret
+    return None
+
+
+async def start_stream_batch(obsclient: simpleobsws.WebSocketClient,
+                             key: str, youtube_server: str = None, deadline: Deadline = None) -> list:
+    """
+    Настраивает и запускает стрим одной пачкой. Проверку делает сама OBS:
+    если стрим уже идёт, SetStreamServiceSettings вернёт OUTPUT_RUNNING,
+    и StartStream не выполнится
+    """
+    return await call_batch(obsclient, [stream_settings_request(key, youtube_server),
+                                        simpleobsws.Request('StartStream')], deadline=deadline)
+
+
+async def stop_stream_batch(obsclient: simpleobsws.WebSocketClient, deadline: Deadline = None) -> list:
+    """
+    Останавливает стрим. Если он не идёт, OBS вернёт OUTPUT_NOT_RUNNING
+    """
+    return await call_batch(obsclient, [simpleobsws.Request('StopStream')], deadline=deadline)
+
+
+async def start_recording_batch(obsclient: simpleobsws.WebSocketClient, deadline: Deadline = None) -> list:
+    """
+    Начинает запись. Если она уже идёт, OBS вернёт OUTPUT_RUNNING
+    """
+    return await call_batch(obsclient, [simpleobsws.Request('StartRecord')], deadline=deadline)
+
+
+async def stop_recording_batch(obsclient: simpleobsws.WebSocketClient, deadline: Deadline = None) -> list:
+    """
+    Прекращает запись. Если она не идёт, OBS вернёт OUTPUT_NOT_RUNNING
+    """
+    return await call_batch(obsclient, [simpleobsws.Request('StopRecord')], deadline=deadline)
+
+
+async def start_youtube_stream(obsclient: simpleobsws.WebSocketClient,
+                               key: str, youtube_server: str = None, deadline: Deadline = None):
+    """
+    Принимает объект класса simpleobsws.WebSocketClient (OBS) и
+    ключ трансляции. Начинает стрим на этой OBS с этим ключом
+    """
+    results = await start_stream_batch(obsclient, key, youtube_server, deadline)
+    if batch_failure(results) is None:  # проверка
+        logger.info("Request 'start stream' succeeded!")
+
+
+async def stop_youtube_stream(obsclient: simpleobsws.WebSocketClient, deadline: Deadline = None):
     """
     Принимает объект класса simpleobsws.WebSocketClient (OBS).
     Заканчивает стрим на этой OBS
     """
-    await obsclient.connect()
-    await obsclient.wait_until_identified()
-
     request = simpleobsws.Request('StopStream')  # запрос "остановить стрим"
-    ret = await obsclient.call(request)  # запускаем его
+    ret = await obs_call(obsclient, request, deadline)  # запускаем его
     if ret.ok():  # проверка
         logger.info("Request 'stop stream' succeeded!")
 
-    await obsclient.disconnect()
-
 
 async def set_stream_parameters(obsclient: simpleobsws.WebSocketClient,
-                                key: str, youtube_server: str = None):
+                                key: str, youtube_server: str = None, deadline: Deadline = None):
     """
     Принимает объект класса simpleobsws.WebSocketClient (OBS) и
     ключ трансляции. Устанавливает настройки этой OBS: тип трансляции,
     сервер, ключ
     """
-    if youtube_server is None:
-        youtube_server = "rtmp://a.rtmp.youtube.com/live2"
-    await obsclient.connect()
-    await obsclient.wait_until_identified()
-
     # установим нужные настройки стрима:
-    request = simpleobsws.Request('SetStreamServiceSettings', requestData={
-        "streamServiceSettings":
-            {"bwtest": False,
-             "key": key,
-             "server": youtube_server,
-             "service": "YouTube - RTMPS"},
-        "streamServiceType": "rtmp_common"})
-
-    ret = await obsclient.call(request)  # отправляем запрос
+    request = stream_settings_request(key, youtube_server)
+    ret = await obs_call(obsclient, request, deadline)  # отправляем запрос
     if ret.ok():  # проверка
-        logger.info("Request 'start stream' succeeded!")
-
-    await obsclient.disconnect()
+        logger.info("Request 'set stream parameters' succeeded!")
 
 
-async def start_recording(obsclient: simpleobsws.WebSocketClient):
+async def start_recording(obsclient: simpleobsws.WebSocketClient, deadline: Deadline = None):
     """
     Принимает объект класса simpleobsws.WebSocketClient (OBS).
     Начинает запись на этой OBS.
     """
 
-    await obsclient.connect()
-    await obsclient.wait_until_identified()
-
     request = simpleobsws.Request('StartRecord')  # запрос "начать стрим"
-    ret = await obsclient.call(request)  # запускаем его
+    ret = await obs_call(obsclient, request, deadline)  # запускаем его
     if ret.ok():  # проверка
         logger.info("Request 'start record' succeeded!")
 
-    await obsclient.disconnect()
-
 
-async def stop_recording(obsclient: simpleobsws.WebSocketClient):
+async def stop_recording(obsclient: simpleobsws.WebSocketClient, deadline: Deadline = None):
     """
     Принимает объект класса simpleobsws.WebSocketClient (OBS).
     Прекращает запись на этой OBS.
     """
 
-    await obsclient.connect()
-    await obsclient.wait_until_identified()
-
     request = simpleobsws.Request('StopRecord')  # запрос "начать стрим"
-    ret = await obsclient.call(request)  # запускаем его
+    ret = await obs_call(obsclient, request, deadline)  # запускаем его
     if ret.ok():  # проверка
         logger.info("Request 'stop record' succeeded!")
 
-    await obsclient.disconnect()
 
-
-async def ping_obs(obsclient: simpleobsws.WebSocketClient):
+async def ping_obs(obsclient: simpleobsws.WebSocketClient, deadline: Deadline = None):
     """
     Принимает объект класса simpleobsws.WebSocketClient (OBS).
     Отправляет запрос. Если это удаётся сделать, возвращает True
     Если нет, то False
     """
+    state = stand_states.fresh(obsclient)
+    if state is not None and state.subscribed:  # живая сессия с подпиской на события
+        return True
     try:
-        await obsclient.connect()
-        await obsclient.wait_until_identified()
-
         request = simpleobsws.Request('GetStats')  # запрос "посмотреть статистику"
-        ret = await obsclient.call(request)  # запускаем его
-
-        await obsclient.disconnect()
+        ret = await obs_call(obsclient, request, deadline)  # запускаем его
         return True
+    except DeadlineExceeded:
+        raise
     except Exception as err:
         return False
 
 
-async def ping_stream(obsclient: simpleobsws.WebSocketClient):
+async def _stream_status(obsclient: simpleobsws.WebSocketClient, deadline: Deadline = None):
     """
-    Проверяет статус стрима на обс-клиенте
-    Возвращает True, если стрим идёт, и False -- если нет
+    Возвращает состояние стенда после обновления данных о стриме:
+    из кэша, если он актуален, иначе живым запросом GetStreamStatus
     """
-    await obsclient.connect()
-    await obsclient.wait_until_identified()
+    state = stand_states.fresh(obsclient)
+    if state is None or state.stream_active is None:
+        request = simpleobsws.Request('GetStreamStatus')  # запрос "посмотреть статистику"
+        ret = await obs_call(obsclient, request, deadline)  # запускаем его
+        stand_states.update_stream(client_key(obsclient), ret.responseData)
+        state = stand_states.state(client_key(obsclient))
+    return state
 
-    request = simpleobsws.Request('GetStreamStatus')  # запрос "посмотреть статистику"
-    ret = await obsclient.call(request)  # запускаем его
-    await obsclient.disconnect()
 
-    return ret.responseData['outputActive']
+async def _record_status(obsclient: simpleobsws.WebSocketClient, deadline: Deadline = None):
+    """
+    То же, что _stream_status, но для записи (GetRecordStatus)
+    """
+    state = stand_states.fresh(obsclient)
+    if state is None or state.record_active is None:
+        request = simpleobsws.Request('GetRecordStatus')  # запрос "посмотреть статистику"
+        ret = await obs_call(obsclient, request, deadline)  # запускаем его
+        stand_states.update_record(client_key(obsclient), ret.responseData)
+        state = stand_states.state(client_key(obsclient))
+    return state
 
 
-async def stream_time(obsclient: simpleobsws.WebSocketClient):
+async def ping_stream(obsclient: simpleobsws.WebSocketClient, deadline: Deadline = None):
     """
-    Проверяет время записи на обс-клиенте
+    Проверяет статус стрима на обс-клиенте
+    Возвращает True, если стрим идёт, и False -- если нет
     """
-    await obsclient.connect()
-    await obsclient.wait_until_identified()
+    state = await _stream_status(obsclient, deadline)
+    return state.stream_active
 
-    request = simpleobsws.Request('GetStreamStatus')  # запрос "посмотреть статистику"
-    ret = await obsclient.call(request)  # запускаем его
 
-    await obsclient.disconnect()
-
-    return str(ret.responseData['outputTimecode'])
+async def stream_time(obsclient: simpleobsws.WebSocketClient, deadline: Deadline = None):
+    """
+    Проверяет время стрима на обс-клиенте
+    """
+    state = await _stream_status(obsclient, deadline)
+    if not state.stream_active:
+        return format_timecode(time.time())
+    return format_timecode(state.stream_started_at)
 
 
-async def ping_recording(obsclient: simpleobsws.WebSocketClient):
+async def ping_recording(obsclient: simpleobsws.WebSocketClient, deadline: Deadline = None):
     """
     Проверяет статус записи на обс-клиенте
     Возвращает True, если запись идёт, и False -- если нет
     """
-    await obsclient.connect()
-    await obsclient.wait_until_identified()
-
-    request = simpleobsws.Request('GetRecordStatus')  # запрос "посмотреть статистику"
-    ret = await obsclient.call(request)  # запускаем его
-
-    await obsclient.disconnect()
+    state = await _record_status(obsclient, deadline)
+    return state.record_active
 
-    return ret.responseData['outputActive']
 
-
-async def recording_time(obsclient: simpleobsws.WebSocketClient):
+async def recording_time(obsclient: simpleobsws.WebSocketClient, deadline: Deadline = None):
     """
     Проверяет время записи на обс-клиенте
     """
-    await obsclient.connect()
-    await obsclient.wait_until_identified()
+    state = await _record_status(obsclient, deadline)
+    if not state.record_active:
+        return format_timecode(time.time())
+    return format_timecode(state.record_started_at)
 
-    request = simpleobsws.Request('GetRecordStatus')  # запрос "посмотреть статистику"
-    ret = await obsclient.call(request)  # запускаем его
 
-    await obsclient.disconnect()
-    return str(ret.responseData['outputTimecode'])
+async def _scene_catalog(obsclient: simpleobsws.WebSocketClient, deadline: Deadline = None):
+    """
+    Возвращает каталог сцен стенда: из кэша, если сессия жива, иначе загружает
+    его запросом GetSceneList
+    """
+    catalog = scene_catalogs.get(obsclient)
+    if catalog is None:
+        request = simpleobsws.Request('GetSceneList')
+        ret = await obs_call(obsclient, request, deadline)  # запускаем его
+        catalog = scene_catalogs.store(client_key(obsclient), ret.responseData)
+    return catalog
 
 
-async def get_scenes(obsclient: simpleobsws.WebSocketClient):
+async def get_scenes(obsclient: simpleobsws.WebSocketClient, deadline: Deadline = None):
     """
     Возвращает текущую сцену и список остальных
     """
+    catalog = await _scene_catalog(obsclient, deadline)
+    return catalog.to_dict()
 
-    await obsclient.connect()
-    await obsclient.wait_until_identified()
 
-    request = simpleobsws.Request('GetSceneList')
-    ret = await obsclient.call(request)  # запускаем его
-
-    await obsclient.disconnect()
-    all_scenes = [item['sceneName'] for item in ret.responseData['scenes']]
-
-    return {'current': ret.responseData['currentProgramSceneName'], 'all': all_scenes}
+async def scene_exists(obsclient: simpleobsws.WebSocketClient, scene_name: str, deadline: Deadline = None):
+    """
+    Проверяет, есть ли на стенде сцена с точно таким именем
+    """
+    catalog = await _scene_catalog(obsclient, deadline)
+    return scene_name in catalog.names
 
 
-async def set_scene(obsclient: simpleobsws.WebSocketClient, scene_name: str):
+async def set_scene(obsclient: simpleobsws.WebSocketClient, scene_name: str, deadline: Deadline = None):
     """
     Устанавливает сцену с именем scene_name в Program выход
     """
 
-    await obsclient.connect()
-    await obsclient.wait_until_identified()
-
     request = simpleobsws.Request('SetCurrentProgramScene', requestData={'sceneName': scene_name})
-    ret = await obsclient.call(request)  # запускаем его
+    ret = await obs_call(obsclient, request, deadline)  # запускаем его
+
 
-    await obsclient.disconnect()
+async def get_screenshot(obsclient: simpleobsws.WebSocketClient, source_name: str, width: int, height: int,
+                         quality: int, deadline: Deadline = None):
+    """
+    Снимает JPEG источника source_name (сцены) размером width x height.
+    Масштабирует и сжимает сама OBS, по сети идёт уже маленькая картинка.
+    Возвращает байты картинки или None, если OBS не смогла её снять
+    """
+    request = simpleobsws.Request('GetSourceScreenshot', requestData={
+        'sourceName': source_name,
+        'imageFormat': 'jpg',
+        'imageWidth': width,
+        'imageHeight': height,
+        'imageCompressionQuality': quality})
+    ret = await obs_call(obsclient, request, deadline)
+    if not ret.ok():
+        logger.info(f"Screenshot of '{source_name}' failed: {ret.requestStatus.comment}")
+        return None
+    # imageData приходит как data URI: data:image/jpg;base64,...
+    return base64.b64decode(ret.responseData['imageData'].split(',', 1)[1])
 
 
 async def main():
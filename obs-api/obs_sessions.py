@@ -0,0 +1,285 @@
+import asyncio
+import random
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, List
+
+import simpleobsws
+from loguru import logger
+
+from circuit_breaker import CircuitBreakerRegistry
+from deadline import Deadline, DeadlineExceeded
+from obs_client import ObsClient
+from utils import OBS_POOL_CONFIG, OBS_CIRCUIT_CONFIG, OBS_CLIENT_CONFIG, run_bounded
+
+
+class ObsConnectionError(Exception):
+    """
+    Raised when an identified session with an OBS stand can't be established.
+    """
+
+
+class CircuitOpenError(ObsConnectionError):
+    """
+    Raised without connecting while the circuit breaker of the stand is open.
+    """
+
+
+def stand_key(ip: str, port) -> str:
+    return f'{ip}:{port}'
+
+
+def client_key(obsclient: simpleobsws.WebSocketClient) -> str:
+    return obsclient.url.split('ws://')[1]
+
+
+def make_client(key: str, password: str):
+    """
+    Builds a not yet connected client for the stand, simpleobsws or the native one (OBS_CLIENT_CONFIG).
+    """
+    parameters = simpleobsws.IdentificationParameters(
+        ignoreNonFatalRequestChecks=False)
+    if OBS_CLIENT_CONFIG['native']:
+        return ObsClient(url=f'ws://{key}', password=password, identification_parameters=parameters,
+                         use_msgpack=OBS_CLIENT_CONFIG['msgpack'])
+    return simpleobsws.WebSocketClient(
+        url=f'ws://{key}',
+        password=password,
+        identification_parameters=parameters)
+
+
+class ObsSession:
+    """
+    One long-lived websocket session with a stand and its bookkeeping.
+    """
+
+    def __init__(self, key: str, client: simpleobsws.WebSocketClient):
+        self.key = key
+        self.client = client
+        self.leases = 0
+        self.last_used = time.monotonic()
+        self.lock = asyncio.Lock()
+        self.retired = False  # заменена сессией с другим паролем, закрыть после последней аренды
+
+    @property
+    def identified(self) -> bool:
+        ws = self.client.ws
+        return ws is not None and ws.open and self.client.identified
+
+
+class ObsConnectionManager:
+    """
+    Keeps one identified simpleobsws.WebSocketClient per stand (keyed by ip:port)
+    and leases it to obs_functions helpers instead of connecting on every call.
+    """
+
+    def __init__(self, circuit_breakers: CircuitBreakerRegistry, max_connections: int,
+                 idle_timeout: float, reconnect_attempts: int, backoff_base: float, backoff_max: float):
+        self.circuit_breakers = circuit_breakers
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.reconnect_attempts = reconnect_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._sessions: Dict[str, ObsSession] = OrderedDict()
+        self._connect_hooks: List[Callable] = []
+
+    def add_connect_hook(self, hook: Callable):
+        """
+        Registers hook(key, client) that is called every time a session gets identified.
+        """
+        self._connect_hooks.append(hook)
+
+    def is_identified(self, key: str) -> bool:
+        session = self._sessions.get(key)
+        return session is not None and session.identified
+
+    def clients(self) -> Dict[str, simpleobsws.WebSocketClient]:
+        """
+        Returns pooled clients by stand key.
+        """
+        return {key: session.client for key, session in self._sessions.items()}
+
+    def get_client(self, ip: str, port, password: str) -> simpleobsws.WebSocketClient:
+        """
+        Returns the pooled client for the stand, creating it if needed.
+        The client is connected lazily on the first lease.
+        """
+        key = stand_key(ip, port)
+        session = self._sessions.get(key)
+        if session is None or session.client.password != password:
+            session = self._register(key, make_client(key, password))
+        return session.client
+
+    def _register(self, key: str, client: simpleobsws.WebSocketClient) -> ObsSession:
+        old = self._sessions.pop(key, None)
+        if old is not None:
+            self._retire(old)
+        else:
+            self._make_room()
+        session = ObsSession(key, client)
+        self._sessions[key] = session
+        return session
+
+    def _adopt(self, obsclient: simpleobsws.WebSocketClient) -> ObsSession:
+        """
+        Finds the session for a client. Clients built outside of the pool
+        (e.g. for calendar requests) reuse the pooled session of the same stand.
+        """
+        key = client_key(obsclient)
+        session = self._sessions.get(key)
+        if session is None or (session.client is not obsclient
+                               and session.client.password != obsclient.password):
+            session = self._register(key, obsclient)
+        self._sessions.move_to_end(key)
+        return session
+
+    def _make_room(self):
+        if len(self._sessions) < self.max_connections:
+            return
+        # самая давно не использованная сессия, которую сейчас никто не держит
+        for key, session in self._sessions.items():
+            if session.leases == 0:
+                logger.info(f'OBS connection limit reached, closing session {key}')
+                del self._sessions[key]
+                self._close_later(session)
+                return
+        raise ObsConnectionError(f'OBS connection limit ({self.max_connections}) reached')
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        for key, session in list(self._sessions.items()):
+            if session.leases == 0 and now - session.last_used > self.idle_timeout:
+                logger.info(f'Closing idle OBS session {key}')
+                del self._sessions[key]
+                self._close_later(session)
+
+    def _retire(self, session: ObsSession):
+        """
+        Closes a replaced session now or, if it is leased, when the last lease is released.
+        """
+        if session.leases == 0:
+            self._close_later(session)
+        else:
+            session.retired = True
+
+    @staticmethod
+    def _close_later(session: ObsSession):
+        async def close():
+            try:
+                await session.client.disconnect()
+            except Exception as err:
+                logger.debug(f'Error while closing OBS session {session.key}: {err}')
+
+        asyncio.get_event_loop().create_task(close())
+
+    async def _connect(self, session: ObsSession, deadline: Deadline):
+        client = session.client
+        await deadline.run('connect', client.connect())
+        # собственный таймаут simpleobsws длиннее, чтобы по времени срабатывал дедлайн
+        identify_timeout = deadline.timeout('identify') + 1
+        if not await deadline.run('identify', client.wait_until_identified(timeout=identify_timeout)):
+            raise ObsConnectionError(f'OBS {session.key} did not identify the client')
+
+    @staticmethod
+    async def _reset(session: ObsSession):
+        try:
+            await session.client.disconnect()
+        except Exception:
+            pass
+
+    async def _connect_with_retries(self, session: ObsSession, deadline: Deadline):
+        for attempt in range(self.reconnect_attempts):
+            try:
+                await self._connect(session, deadline)
+                return
+            except (asyncio.CancelledError, DeadlineExceeded):
+                # не оставляем полуоткрытый сокет, если ожидание прервано
+                await self._reset(session)
+                raise
+            except Exception as err:
+                await self._reset(session)
+                delay = min(self.backoff_max, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1)
+                if attempt == self.reconnect_attempts - 1 or delay >= deadline.remaining():
+                    raise ObsConnectionError(f'Could not connect to OBS {session.key}: {err}') from err
+                await asyncio.sleep(delay)
+
+    async def _ensure_identified(self, session: ObsSession, deadline: Deadline):
+        # ожидание ограничено тем, кто сейчас подключается: у него свой дедлайн
+        await session.lock.acquire()
+        try:
+            if session.identified:
+                return
+            breaker = self.circuit_breakers.get(session.key)
+            if not breaker.allow():
+                raise CircuitOpenError(f'OBS {session.key} is unreachable, circuit is {breaker.state}')
+            # для breaker'а все попытки одного подключения -- одна неудача
+            try:
+                await self._connect_with_retries(session, deadline)
+            except BaseException:
+                breaker.record_failure()
+                raise
+            breaker.record_success()
+            logger.info(f'OBS session {session.key} identified')
+            for hook in self._connect_hooks:
+                hook(session.key, session.client)
+        finally:
+            session.lock.release()
+
+    @asynccontextmanager
+    async def lease(self, obsclient: simpleobsws.WebSocketClient, deadline: Deadline = None):
+        """
+        Yields an identified client for the stand of obsclient.
+        Use the yielded client, it may be the pooled one and not obsclient itself.
+        Connecting and identification are limited by deadline.
+        """
+        if deadline is None:
+            deadline = Deadline()
+        session = self._adopt(obsclient)
+        session.leases += 1
+        try:
+            await self._ensure_identified(session, deadline)
+            yield session.client
+        finally:
+            session.leases -= 1
+            session.last_used = time.monotonic()
+            if session.retired and session.leases == 0:
+                self._close_later(session)
+            self._evict_idle()
+
+    async def warm_up(self, stands: List[tuple], concurrency: int, timeout: float) -> Dict[str, bool]:
+        """
+        Establishes identified sessions with stands given as (ip, port, password),
+        at most concurrency at a time, each within timeout seconds.
+        Only the first max_connections stands are warmed up, the rest would evict them.
+        Returns whether each stand (by key) got identified.
+        """
+        stands = stands[:self.max_connections]
+
+        async def warm_up_stand(stand):
+            ip, port, password = stand
+            try:
+                async with self.lease(self.get_client(ip, port, password), Deadline(timeout)):
+                    return True
+            except Exception as err:
+                logger.info(f'Could not warm up OBS {stand_key(ip, port)}: {err}')
+                return False
+
+        results = await run_bounded(warm_up_stand, stands, concurrency)
+        return {stand_key(ip, port): result for (ip, port, password), result in zip(stands, results)}
+
+    async def close(self):
+        """
+        Disconnects all pooled sessions.
+        """
+        sessions = list(self._sessions.values())
+        self._sessions.clear()
+        for session in sessions:
+            try:
+                await session.client.disconnect()
+            except Exception as err:
+                logger.debug(f'Error while closing OBS session {session.key}: {err}')
+
+
+connection_manager = ObsConnectionManager(CircuitBreakerRegistry(**OBS_CIRCUIT_CONFIG), **OBS_POOL_CONFIG)
@@ -0,0 +1,180 @@
+import asyncio
+import time
+import weakref
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import simpleobsws
+from loguru import logger
+
+from obs_sessions import connection_manager, client_key
+from utils import OBS_STATE_CONFIG
+
+
+@dataclass
+class StandState:
+    """
+    Last known state of a stand. Timestamps are unix time.
+    """
+    stream_active: Optional[bool] = None
+    record_active: Optional[bool] = None
+    current_scene: Optional[str] = None
+    stream_started_at: Optional[float] = None
+    record_started_at: Optional[float] = None
+    updated_at: float = 0.0
+    subscribed: bool = False  # True while events of a live session keep the state up to date
+
+    def to_dict(self) -> dict:
+        return {'stream_status': self.stream_active, 'recording_status': self.record_active,
+                'current_scene': self.current_scene, 'updated_at': self.updated_at}
+
+
+def format_timecode(started_at: float) -> str:
+    """
+    Formats time passed since started_at the way OBS formats outputTimecode.
+    """
+    elapsed = max(0.0, time.time() - started_at)
+    hours, rest = divmod(elapsed, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f'{int(hours):02}:{int(minutes):02}:{seconds:06.3f}'
+
+
+class StandStateCache:
+    """
+    Per-stand state kept up to date by obs-websocket events of pooled sessions.
+    Status helpers answer from it and fall back to a live query when it is stale.
+    """
+
+    def __init__(self, max_age: float):
+        self.max_age = max_age
+        self._states: Dict[str, StandState] = {}
+        self._attached = weakref.WeakSet()
+        self._event_at: Dict[Tuple[str, str], float] = {}  # (ip:port, поле) -> monotonic время события
+        self._listeners: List[Callable] = []
+        self._published: Dict[str, tuple] = {}
+
+    def add_listener(self, listener: Callable):
+        """
+        Registers listener(key, state) that is called every time the state of a stand changes.
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _publish(self, key: str):
+        state = self.state(key)
+        snapshot = (state.stream_active, state.record_active, state.current_scene)
+        if self._published.get(key) == snapshot:  # опрос без изменений не рассылаем
+            return
+        self._published[key] = snapshot
+        for listener in list(self._listeners):
+            try:
+                listener(key, state)
+            except Exception as err:
+                logger.error(f'State listener failed for OBS {key}: {err}')
+
+    def state(self, key: str) -> StandState:
+        if key not in self._states:
+            self._states[key] = StandState()
+        return self._states[key]
+
+    def fresh(self, obsclient: simpleobsws.WebSocketClient) -> Optional[StandState]:
+        """
+        Returns the cached state if it can be trusted, otherwise None.
+        """
+        state = self._states.get(client_key(obsclient))
+        if state is None:
+            return None
+        if state.subscribed and connection_manager.is_identified(client_key(obsclient)):
+            return state
+        if time.time() - state.updated_at < self.max_age:
+            return state
+        return None
+
+    def attach(self, key: str, client: simpleobsws.WebSocketClient):
+        """
+        Connect hook of the connection manager: subscribes to events of a
+        freshly identified session and seeds the state with one batch.
+        """
+        if client not in self._attached:
+            self._attached.add(client)
+
+            async def on_stream_state(data):
+                self._event_at[key, 'stream'] = time.monotonic()
+                self.update_stream(key, data)
+
+            async def on_record_state(data):
+                self._event_at[key, 'record'] = time.monotonic()
+                self.update_record(key, data)
+
+            async def on_scene(data):
+                self._event_at[key, 'scene'] = time.monotonic()
+                self.state(key).current_scene = data['sceneName']
+                self.touch(key)
+
+            async def on_exit(data):
+                logger.info(f'OBS {key} is shutting down')
+                self.state(key).subscribed = False
+
+            client.register_event_callback(on_stream_state, 'StreamStateChanged')
+            client.register_event_callback(on_record_state, 'RecordStateChanged')
+            client.register_event_callback(on_scene, 'CurrentProgramSceneChanged')
+            client.register_event_callback(on_exit, 'ExitStarted')
+        self.state(key).subscribed = False
+        asyncio.get_event_loop().create_task(self._seed(key, client))
+
+    def _changed_since(self, key: str, field: str, since: float) -> bool:
+        return self._event_at.get((key, field), 0.0) > since
+
+    async def _seed(self, key: str, client: simpleobsws.WebSocketClient):
+        # ответ может обработаться позже события, пришедшего после него:
+        # такое событие новее ответа, и его не перезаписываем
+        sent_at = time.monotonic()
+        try:
+            results = await client.call_batch([simpleobsws.Request('GetStreamStatus'),
+                                               simpleobsws.Request('GetRecordStatus'),
+                                               simpleobsws.Request('GetCurrentProgramScene')])
+        except Exception as err:
+            logger.debug(f'Could not seed state of OBS {key}: {err}')
+            return
+        stream, record, scene = results
+        if stream.ok() and not self._changed_since(key, 'stream', sent_at):
+            self.update_stream(key, stream.responseData)
+        if record.ok() and not self._changed_since(key, 'record', sent_at):
+            self.update_record(key, record.responseData)
+        if scene.ok() and not self._changed_since(key, 'scene', sent_at):
+            self.state(key).current_scene = scene.responseData['currentProgramSceneName']
+        self.state(key).subscribed = True
+        self.touch(key)
+
+    def touch(self, key: str):
+        self.state(key).updated_at = time.time()
+        self._publish(key)
+
+    def update_stream(self, key: str, data: dict):
+        """
+        Accepts both GetStreamStatus response and StreamStateChanged event data.
+        """
+        state = self.state(key)
+        active = data['outputActive']
+        if active and not state.stream_active:
+            state.stream_started_at = time.time() - data.get('outputDuration', 0) / 1000
+        state.stream_active = active
+        self.touch(key)
+
+    def update_record(self, key: str, data: dict):
+        """
+        Accepts both GetRecordStatus response and RecordStateChanged event data.
+        """
+        state = self.state(key)
+        active = data['outputActive']
+        if active and not state.record_active:
+            state.record_started_at = time.time() - data.get('outputDuration', 0) / 1000
+        state.record_active = active
+        self.touch(key)
+
+
+stand_states = StandStateCache(**OBS_STATE_CONFIG)
+connection_manager.add_connect_hook(stand_states.attach)
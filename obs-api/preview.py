@@ -0,0 +1,93 @@
+import asyncio
+import hashlib
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+from urllib.parse import quote
+
+import simpleobsws
+
+from deadline import Deadline, DeadlineExceeded
+from obs_functions import get_scenes, get_screenshot
+from obs_sessions import client_key
+from singleflight import SingleFlight
+from utils import OBS_PREVIEW_CONFIG
+
+
+@dataclass
+class Preview:
+    """
+    One captured JPEG of the program output of a stand.
+    """
+    image: bytes
+    scene: str
+    captured_at: float = field(default_factory=time.time)
+    etag: str = ''
+
+    def __post_init__(self):
+        if not self.etag:
+            self.etag = '"' + hashlib.sha1(self.image).hexdigest() + '"'
+
+    def headers(self, max_age: float) -> dict:
+        """
+        HTTP headers of the preview response. Header values must be latin-1,
+        so the scene name is percent-encoded (UTF-8, RFC 3986).
+        """
+        return {'ETag': self.etag,
+                'Cache-Control': f'max-age={max_age}',
+                'X-Scene-Name': quote(self.scene, safe='')}
+
+
+class PreviewCache:
+    """
+    Program output previews of stands, kept for ttl seconds. Concurrent
+    requests for a stand whose preview is stale wait for one shared capture,
+    so the encoding machine takes at most one screenshot per ttl.
+    """
+
+    def __init__(self, ttl: float, width: int, height: int, quality: int):
+        self.ttl = ttl
+        self.width = width
+        self.height = height
+        self.quality = quality
+        self._previews: Dict[str, Preview] = {}
+        self._captures = SingleFlight()
+
+    def cached(self, key: str) -> Optional[Preview]:
+        preview = self._previews.get(key)
+        if preview is None or time.time() - preview.captured_at > self.ttl:
+            return None
+        return preview
+
+    async def _capture(self, key: str, obsclient: simpleobsws.WebSocketClient,
+                       deadline: Deadline) -> Optional[Preview]:
+        scene = (await get_scenes(obsclient, deadline))['current']
+        image = await get_screenshot(obsclient, scene, self.width, self.height, self.quality, deadline)
+        if image is None:
+            return None
+        preview = Preview(image, scene)
+        self._previews[key] = preview
+        return preview
+
+    async def get(self, obsclient: simpleobsws.WebSocketClient, deadline: Deadline = None) -> Optional[Preview]:
+        """
+        Returns a preview not older than ttl, capturing a new one if needed.
+        Returns None if OBS could not take the screenshot.
+        """
+        key = client_key(obsclient)
+        preview = self.cached(key)
+        if preview is not None:
+            return preview
+        if deadline is None:
+            deadline = Deadline()
+        # общий снимок делается со своим бюджетом, каждый ждёт его в пределах своего дедлайна
+        try:
+            return await self._captures.do(key, lambda: self._capture(key, obsclient, Deadline()),
+                                           timeout=max(0, deadline.remaining()))
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded('request', deadline)
+        except DeadlineExceeded as err:
+            raise DeadlineExceeded(err.phase, deadline)
+
+
+preview_cache = PreviewCache(**OBS_PREVIEW_CONFIG)
@@ -0,0 +1,96 @@
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Set, Union
+
+
+def user_tag(user_id) -> str:
+    return f'user:{user_id}'
+
+
+def group_tag(group_id) -> str:
+    return f'group:{group_id}'
+
+
+def stand_tag(ip: str, port) -> str:
+    return f'stand:{ip}:{port}'
+
+
+class ResponseCache:
+    """
+    LRU cache of read endpoint responses with at most max_entries entries.
+    Every entry has tags (user:<id>, group:<id>, stand:<ip>:<port>) and write
+    endpoints drop exactly the entries tagged with what they changed.
+    ttl bounds staleness from writes made past this process.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: Dict[Hashable, tuple] = OrderedDict()  # key -> (value, stored_at, tags)
+        self._keys_by_tag: Dict[str, Set[Hashable]] = {}
+        self._generation = 0  # растёт при каждой инвалидации
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable):
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[1] > self.ttl:
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key: Hashable, value, tags: Iterable[str]):
+        if key in self._entries:
+            self._remove(key)
+        tags = set(tags)
+        self._entries[key] = (value, time.monotonic(), tags)
+        for tag in tags:
+            self._keys_by_tag.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable],
+                          tags: Union[Iterable[str], Callable[[Any], Iterable[str]]]):
+        """
+        Returns the cached value or loads and caches it. tags may be a function
+        of the loaded value. A value loaded while some write invalidated the
+        cache may already be stale, so it is returned but not cached.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        generation = self._generation
+        value = await loader()
+        if generation == self._generation:
+            self.put(key, value, tags(value) if callable(tags) else tags)
+        return value
+
+    def invalidate(self, *tags: str):
+        self._generation += 1
+        for tag in tags:
+            for key in list(self._keys_by_tag.get(tag, ())):
+                self._remove(key)
+                self.invalidations += 1
+
+    def _remove(self, key: Hashable):
+        value, stored_at, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {'entries': len(self._entries), 'max_entries': self.max_entries,
+                'hits': self.hits, 'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions, 'invalidations': self.invalidations}
@@ -0,0 +1,90 @@
+import weakref
+from typing import Dict, List, Optional
+
+import simpleobsws
+
+from obs_sessions import connection_manager, client_key
+
+
+class SceneCatalog:
+    """
+    Scenes of one stand: ordered list for output and a set for exact O(1) lookups.
+    """
+
+    def __init__(self, scenes: List[str], current: str):
+        self.scenes = scenes
+        self.names = set(scenes)
+        self.current = current
+
+    def rename(self, old_name: str, new_name: str):
+        self.scenes = [new_name if name == old_name else name for name in self.scenes]
+        self.names = set(self.scenes)
+        if self.current == old_name:
+            self.current = new_name
+
+    def to_dict(self) -> dict:
+        return {'current': self.current, 'all': list(self.scenes)}
+
+
+class SceneCatalogCache:
+    """
+    Scene catalogues of stands, loaded once with GetSceneList and then kept
+    up to date by SceneListChanged, SceneNameChanged and
+    CurrentProgramSceneChanged events of the pooled session.
+    """
+
+    def __init__(self):
+        self._catalogs: Dict[str, SceneCatalog] = {}
+        self._attached = weakref.WeakSet()
+
+    def get(self, obsclient: simpleobsws.WebSocketClient) -> Optional[SceneCatalog]:
+        """
+        Returns the catalogue only while the session that keeps it up to date is alive.
+        """
+        key = client_key(obsclient)
+        if not connection_manager.is_identified(key):
+            return None
+        return self._catalogs.get(key)
+
+    def store(self, key: str, scene_list: dict) -> SceneCatalog:
+        """
+        Stores a catalogue built from a GetSceneList response.
+        """
+        catalog = SceneCatalog([item['sceneName'] for item in scene_list['scenes']],
+                               scene_list['currentProgramSceneName'])
+        self._catalogs[key] = catalog
+        return catalog
+
+    def attach(self, key: str, client: simpleobsws.WebSocketClient):
+        """
+        Connect hook of the connection manager. Events missed while the
+        session was down could have changed the scenes, so the catalogue is dropped.
+        """
+        self._catalogs.pop(key, None)
+        if client in self._attached:
+            return
+        self._attached.add(client)
+
+        async def on_scene_list(data):
+            catalog = self._catalogs.get(key)
+            if catalog is not None:
+                catalog.scenes = [item['sceneName'] for item in data['scenes']]
+                catalog.names = set(catalog.scenes)
+
+        async def on_scene_name(data):
+            catalog = self._catalogs.get(key)
+            if catalog is not None:
+                catalog.rename(data['oldSceneName'], data['sceneName'])
+
+        async def on_program_scene(data):
+            catalog = self._catalogs.get(key)
+            if catalog is not None:
+                catalog.current = data['sceneName']
+
+        client.register_event_callback(on_scene_list, 'SceneListChanged')
+        client.register_event_callback(on_scene_name, 'SceneNameChanged')
+        client.register_event_callback(on_program_scene, 'CurrentProgramSceneChanged')
+
+
+scene_catalogs = SceneCatalogCache()
+connection_manager.add_connect_hook(scene_catalogs.attach)
@@ -2,7 +2,7 @@ from enum import Enum
 from typing import List
 from typing import Literal
 
-from pydantic import BaseModel
+from pydantic import BaseModel, conint
 
 
 class UserId(BaseModel):
@@ -19,6 +19,16 @@ class AddGroupMember(BaseModel):
     is_admin: bool
 
 
+class GroupMember(BaseModel):
+    user_id: str
+    is_admin: bool = False
+
+
+class AddGroupMembers(BaseModel):
+    group_id: str
+    members: List[GroupMember]
+
+
 class DeleteGroupMember(BaseModel):
     group_id: str
     user_id: str
@@ -98,6 +108,22 @@ class StopRecordingModel(BaseModel):
     obs_name: str
 
 
+class BulkStreamStand(BaseModel):
+    obs_name: str
+    key: str
+    youtube_server: str
+
+
+class BulkStartStreamModel(BaseModel):
+    user_id: str
+    stands: List[BulkStreamStand]
+
+
+class BulkStandsModel(BaseModel):
+    user_id: str
+    obs_names: List[str]
+
+
 class UserPingStreamObs(BaseModel):
     user_id: str
     obs_name: str
@@ -111,6 +137,13 @@ class PlanStreamModel(BaseModel):
     obs_name: str
 
 
+class ObsStatsModel(BaseModel):
+    user_id: str
+    obs_name: str
+    window: conint(gt=0, le=86400) = 600  # за сколько последних секунд, не больше суток
+    points: conint(gt=0, le=720) = 60  # на сколько точек усреднить, не больше ёмкости буфера
+
+
 class GetScenesModel(BaseModel):
     user_id: str
     obs_name: str
@@ -122,6 +155,11 @@ class SetSceneModel(BaseModel):
     scene_name: str
 
 
+class PreviewModel(BaseModel):
+    user_id: str
+    obs_name: str
+
+
 class GetScheduleModel(BaseModel):
     user_id: str
     obs_name: str
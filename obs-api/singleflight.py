@@ -0,0 +1,37 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller starts
+    the call, everyone who comes while it is in flight waits for the same result.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.started = 0
+        self.shared = 0  # сколько вызовов получили чужой результат
+
+    def _forget(self, key: Hashable, call: asyncio.Future):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        # ошибку уже получили ожидающие; если их отменили, не пишем в лог "never retrieved"
+        if not call.cancelled():
+            call.exception()
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable], timeout: float = None):
+        """
+        Returns the result of factory() shared by all concurrent callers with this key.
+        A caller that gives up after timeout seconds (asyncio.TimeoutError)
+        or is cancelled doesn't cancel the call for the others.
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = asyncio.ensure_future(factory())
+            self._calls[key] = call
+            self.started += 1
+            call.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.shared += 1
+        return await asyncio.wait_for(asyncio.shield(call), timeout=timeout)
@@ -0,0 +1,127 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import simpleobsws
+from loguru import logger
+
+from deadline import Deadline
+from obs_functions import obs_call
+from obs_sessions import connection_manager
+from obs_state import stand_states
+
+
+@dataclass
+class StreamQuality:
+    """
+    Stream output quality of a stand computed from two GetStreamStatus samples.
+    """
+    bitrate_kbps: float
+    drop_rate: float  # доля пропущенных кадров между сэмплами
+    congestion: float
+    skipped_frames: int
+    total_frames: int
+    sampled_at: float = field(default_factory=time.time)
+    alerts: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {'bitrate_kbps': self.bitrate_kbps, 'drop_rate': self.drop_rate,
+                'congestion': self.congestion, 'skipped_frames': self.skipped_frames,
+                'total_frames': self.total_frames, 'sampled_at': self.sampled_at,
+                'alerts': self.alerts}
+
+
+class StreamQualityMonitor:
+    """
+    Samples GetStreamStatus of every live stand each interval seconds and
+    computes bitrate and drop rate from the deltas between samples.
+    """
+
+    def __init__(self, interval: float, timeout: float, min_bitrate_kbps: float,
+                 max_drop_rate: float, max_congestion: float):
+        self.interval = interval
+        self.timeout = timeout
+        self.min_bitrate_kbps = min_bitrate_kbps
+        self.max_drop_rate = max_drop_rate
+        self.max_congestion = max_congestion
+        self._last_sample: Dict[str, tuple] = {}  # ip:port -> (time, bytes, skipped, total)
+        self._quality: Dict[str, StreamQuality] = {}
+        self._task = None
+
+    def quality(self, key: str) -> Optional[StreamQuality]:
+        return self._quality.get(key)
+
+    def _alerts(self, quality: StreamQuality) -> List[str]:
+        alerts = []
+        if quality.bitrate_kbps < self.min_bitrate_kbps:
+            alerts.append('low_bitrate')
+        if quality.drop_rate > self.max_drop_rate:
+            alerts.append('dropped_frames')
+        if quality.congestion > self.max_congestion:
+            alerts.append('congestion')
+        return alerts
+
+    def record(self, key: str, data: dict, timestamp: float = None) -> Optional[StreamQuality]:
+        """
+        Takes a GetStreamStatus response. Returns None until there are two samples to compare.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        if not data['outputActive']:
+            self._last_sample.pop(key, None)
+            self._quality.pop(key, None)
+            return None
+        sample = (timestamp, data['outputBytes'], data['outputSkippedFrames'], data['outputTotalFrames'])
+        previous = self._last_sample.get(key)
+        self._last_sample[key] = sample
+        # счётчики обнуляются при перезапуске стрима
+        if previous is None or sample[1] < previous[1] or sample[0] <= previous[0]:
+            return None
+
+        elapsed = sample[0] - previous[0]
+        frames = sample[3] - previous[3]
+        quality = StreamQuality(
+            bitrate_kbps=round((sample[1] - previous[1]) * 8 / 1000 / elapsed, 1),
+            drop_rate=round((sample[2] - previous[2]) / frames, 4) if frames > 0 else 0.0,
+            congestion=data.get('outputCongestion', 0.0),
+            skipped_frames=sample[2],
+            total_frames=sample[3],
+            sampled_at=timestamp)
+        quality.alerts = self._alerts(quality)
+        old_alerts = self._quality[key].alerts if key in self._quality else []
+        for alert in quality.alerts:
+            if alert not in old_alerts:
+                logger.warning(f'Stream on OBS {key}: {alert} ({quality.to_dict()})')
+        self._quality[key] = quality
+        return quality
+
+    async def sample(self, key: str, obsclient: simpleobsws.WebSocketClient):
+        try:
+            ret = await obs_call(obsclient, simpleobsws.Request('GetStreamStatus'), Deadline(self.timeout))
+        except Exception as err:
+            logger.debug(f'Could not sample stream of OBS {key}: {err}')
+            return
+        stand_states.update_stream(key, ret.responseData)
+        self.record(key, ret.responseData)
+
+    async def _run(self):
+        while True:
+            try:
+                live = [(key, client) for key, client in connection_manager.clients().items()
+                        if stand_states.state(key).stream_active]
+                for key in set(self._quality) - {key for key, client in live}:
+                    self._last_sample.pop(key, None)
+                    self._quality.pop(key, None)
+                await asyncio.gather(*(self.sample(key, client) for key, client in live))
+            except Exception:
+                logger.exception('Stream quality monitor error')
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_event_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
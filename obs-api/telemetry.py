@@ -0,0 +1,103 @@
+import time
+from bisect import bisect_left
+from array import array
+from typing import Dict
+
+from utils import OBS_TELEMETRY_CONFIG
+
+# поля ответа GetStats, которые сохраняем
+METRICS = ('cpuUsage', 'activeFps', 'renderSkippedFrames', 'outputSkippedFrames',
+           'memoryUsage', 'availableDiskSpace')
+
+
+class StatsRingBuffer:
+    """
+    Fixed-size ring buffer of GetStats samples of one stand.
+    Every metric lives in its own array of doubles, so a sample costs
+    no allocations once the buffer is created. Samples are kept in time
+    order, which lets summary() find a window with bisection.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.timestamps = array('d', bytes(8 * capacity))
+        self.values = {metric: array('d', bytes(8 * capacity)) for metric in METRICS}
+        self.head = 0  # куда будет записан следующий сэмпл
+        self.size = 0
+
+    def append(self, timestamp: float, stats: dict):
+        if self.size:
+            # если часы отошли назад, сэмпл получает время предыдущего
+            timestamp = max(timestamp, self.timestamps[self.head - 1])
+        self.timestamps[self.head] = timestamp
+        for metric in METRICS:
+            self.values[metric][self.head] = stats.get(metric, 0.0)
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def _ordered(self, values: array) -> array:
+        """
+        Copy of the filled part of values, oldest sample first.
+        """
+        if self.size < self.capacity:
+            return values[:self.size]
+        return values[self.head:] + values[:self.head]
+
+    def summary(self, window: float, points: int) -> dict:
+        """
+        Returns min, max and mean of every metric over the last window seconds
+        and the same window downsampled to at most points buckets of means.
+        Window and bucket bounds are found by bisection over the timestamps,
+        and the aggregates are taken over array slices.
+        """
+        if window <= 0 or points <= 0:
+            raise ValueError(f'window and points must be positive, got {window} and {points}')
+        since = time.time() - window
+        timestamps = self._ordered(self.timestamps)
+        first = bisect_left(timestamps, since)
+        samples = len(timestamps) - first
+        result = {'samples': samples, 'metrics': {}, 'points': []}
+        if not samples:
+            return result
+
+        values = {metric: self._ordered(self.values[metric])[first:] for metric in METRICS}
+        for metric, metric_values in values.items():
+            result['metrics'][metric] = {'min': min(metric_values), 'max': max(metric_values),
+                                         'mean': sum(metric_values) / samples}
+
+        # границы корзин; сэмплы новее последней границы попадают в последнюю корзину
+        bucket_width = window / points
+        bounds = [bisect_left(timestamps, since + bucket * bucket_width, first) - first
+                  for bucket in range(points)] + [samples]
+        for bucket in range(points):
+            lo, hi = bounds[bucket], bounds[bucket + 1]
+            if lo == hi:
+                continue
+            point = {'t': since + bucket * bucket_width}
+            for metric, metric_values in values.items():
+                point[metric] = sum(metric_values[lo:hi]) / (hi - lo)
+            result['points'].append(point)
+        return result
+
+
+class StandTelemetry:
+    """
+    Ring buffers of all stands, keyed by ip:port.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._buffers: Dict[str, StatsRingBuffer] = {}
+
+    def record(self, key: str, stats: dict, timestamp: float = None):
+        if key not in self._buffers:
+            self._buffers[key] = StatsRingBuffer(self.capacity)
+        self._buffers[key].append(time.time() if timestamp is None else timestamp, stats)
+
+    def summary(self, key: str, window: float, points: int) -> dict:
+        if key not in self._buffers:
+            return {'samples': 0, 'metrics': {}, 'points': []}
+        return self._buffers[key].summary(window, points)
+
+
+stand_telemetry = StandTelemetry(**OBS_TELEMETRY_CONFIG)
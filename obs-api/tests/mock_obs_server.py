@@ -0,0 +1,363 @@
+"""
+Local stand-in for obs-websocket v5 for tests and load tests.
+
+It implements authentication, GetStats, stream and record
+start/stop/status, scene list/switch, screenshots, request batches and
+state events. It can add latency, jitter, lost responses and failing
+requests. MockObsFleet spawns many servers on consecutive ports. From the
+command line it runs a fleet until interrupted:
+
+    python tests/mock_obs_server.py --count 200 --base-port 5000 --password secret --latency 0.02 --jitter 0.01
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import time
+from typing import Dict, List, Optional
+
+import websockets
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# коды RequestStatus obs-websocket v5
+SUCCESS = 100
+UNKNOWN_REQUEST_TYPE = 204
+RESOURCE_NOT_FOUND = 600
+OUTPUT_RUNNING = 500
+OUTPUT_NOT_RUNNING = 501
+REQUEST_PROCESSING_FAILED = 702
+AUTHENTICATION_FAILED = 4009
+
+# JPEG 1x1, которым отвечает GetSourceScreenshot
+PIXEL_JPEG = base64.b64decode(
+    '/9j/4AAQSkZJRgABAQEASABIAAD/2wBDAAgGBgcGBQgHBwcJCQgKDBQNDAsLDBkSEw8UHRofHh0aHBwgJC4nICIsIxwcKDcpLDAxNDQ0'
+    'Hyc5PTgyPC4zNDL/wAALCAABAAEBAREA/8QAFAABAAAAAAAAAAAAAAAAAAAACf/EABQQAQAAAAAAAAAAAAAAAAAAAAD/2gAIAQEAAD8A'
+    'KgB//9k=')
+
+
+def _auth_string(password: str, salt: str, challenge: str) -> str:
+    secret = base64.b64encode(hashlib.sha256((password + salt).encode('utf-8')).digest())
+    return base64.b64encode(hashlib.sha256(secret + challenge.encode('utf-8')).digest()).decode('utf-8')
+
+
+def _timecode(started_at: Optional[float]) -> str:
+    seconds = 0 if started_at is None else time.time() - started_at
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f'{int(hours):02}:{int(minutes):02}:{seconds:06.3f}'
+
+
+class MockObsServer:
+    """
+    One mock stand. latency and jitter delay every response (latency +- jitter
+    seconds), loss is the probability that a response is never sent,
+    failure_rate is the probability that a request fails with
+    REQUEST_PROCESSING_FAILED, and fail_requests maps request types to the
+    status code they always fail with. Counters of received requests are in requests.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, password: str = None,
+                 scenes: List[str] = ('Scene', 'Camera', 'Slides'), latency: float = 0.0, jitter: float = 0.0,
+                 loss: float = 0.0, failure_rate: float = 0.0, fail_requests: Dict[str, int] = None,
+                 seed: int = None):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.scenes = list(scenes)
+        self.current_scene = self.scenes[0]
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.failure_rate = failure_rate
+        self.fail_requests = dict(fail_requests or {})
+        self.random = random.Random(seed)
+        self.stream_started_at = None
+        self.record_started_at = None
+        self.stream_settings = {}
+        self.requests: Dict[str, int] = {}
+        self.connections = 0
+        self._sessions = set()  # опознанные соединения, им рассылаются события
+        self._server = None
+        self._started_at = time.time()
+
+    @property
+    def url(self) -> str:
+        return f'ws://{self.host}:{self.port}'
+
+    async def start(self) -> 'MockObsServer':
+        subprotocols = ['obswebsocket.json'] if msgpack is None else ['obswebsocket.msgpack', 'obswebsocket.json']
+        self._server = await websockets.serve(self._handle, self.host, self.port, max_size=2 ** 24,
+                                              subprotocols=subprotocols)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def drop_connections(self):
+        """
+        Closes all client connections, as if OBS was restarted.
+        """
+        for ws in list(self._sessions):
+            await ws.close()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    @staticmethod
+    def _encode(ws, message: dict):
+        if ws.subprotocol == 'obswebsocket.msgpack':
+            return msgpack.packb(message)
+        return json.dumps(message)
+
+    @staticmethod
+    def _decode(ws, raw) -> dict:
+        if ws.subprotocol == 'obswebsocket.msgpack':
+            return msgpack.unpackb(raw, raw=False)
+        return json.loads(raw)
+
+    async def _send(self, ws, message: dict):
+        try:
+            await ws.send(self._encode(ws, message))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    async def emit(self, event_type: str, data: dict = None):
+        """
+        Sends an event to every identified client.
+        """
+        event = {'op': 5, 'd': {'eventType': event_type, 'eventIntent': 1}}
+        if data is not None:
+            event['d']['eventData'] = data
+        for ws in list(self._sessions):
+            await self._send(ws, event)
+
+    async def _handle(self, ws, path=None):
+        self.connections += 1
+        hello = {'obsWebSocketVersion': '5.1.0', 'rpcVersion': 1}
+        if self.password is not None:
+            hello['authentication'] = {'salt': base64.b64encode(self.random.randbytes(16)).decode(),
+                                       'challenge': base64.b64encode(self.random.randbytes(16)).decode()}
+        await self._send(ws, {'op': 0, 'd': hello})
+        try:
+            async for raw in ws:
+                message = self._decode(ws, raw)
+                op, data = message['op'], message['d']
+                if op == 1:
+                    if self.password is not None and data.get('authentication') != _auth_string(
+                            self.password, hello['authentication']['salt'], hello['authentication']['challenge']):
+                        await ws.close(AUTHENTICATION_FAILED, 'Authentication failed.')
+                        return
+                    self._sessions.add(ws)
+                    await self._send(ws, {'op': 2, 'd': {'negotiatedRpcVersion': 1}})
+                elif ws in self._sessions and op in (6, 8):
+                    # запросы обрабатываются независимо: с задержкой ответы могут прийти не по порядку
+                    asyncio.get_event_loop().create_task(self._respond(ws, op, data))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            self._sessions.discard(ws)
+
+    async def _respond(self, ws, op: int, data: dict):
+        delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+        if delay:
+            await asyncio.sleep(delay)
+        if self.random.random() < self.loss:
+            return
+        if op == 6:
+            response = await self._execute(data)
+            response['requestId'] = data['requestId']
+            await self._send(ws, {'op': 7, 'd': response})
+            return
+        results = []
+        for request in data['requests']:
+            result = await self._execute(request)
+            results.append(result)
+            if data.get('haltOnFailure') and not result['requestStatus']['result']:
+                break
+        await self._send(ws, {'op': 9, 'd': {'requestId': data['requestId'], 'results': results}})
+
+    async def _execute(self, request: dict) -> dict:
+        request_type = request['requestType']
+        self.requests[request_type] = self.requests.get(request_type, 0) + 1
+        if request_type in self.fail_requests:
+            return self._status(request_type, self.fail_requests[request_type], 'Injected failure')
+        if self.random.random() < self.failure_rate:
+            return self._status(request_type, REQUEST_PROCESSING_FAILED, 'Injected failure')
+        handler = getattr(self, f'_request_{request_type}', None)
+        if handler is None:
+            return self._status(request_type, UNKNOWN_REQUEST_TYPE, 'Unknown request type')
+        return await handler(request_type, request.get('requestData') or {})
+
+    @staticmethod
+    def _status(request_type: str, code: int = SUCCESS, comment: str = None, data: dict = None) -> dict:
+        response = {'requestType': request_type,
+                    'requestStatus': {'result': code == SUCCESS, 'code': code}}
+        if comment is not None:
+            response['requestStatus']['comment'] = comment
+        if data is not None:
+            response['responseData'] = data
+        return response
+
+    def _frames(self) -> int:
+        return 0 if self.stream_started_at is None else int((time.time() - self.stream_started_at) * 30)
+
+    async def _request_GetStats(self, request_type, data):
+        return self._status(request_type, data={
+            'cpuUsage': self.random.uniform(1, 20), 'memoryUsage': 400.0, 'availableDiskSpace': 100000.0,
+            'activeFps': 30.0, 'averageFrameRenderTime': 1.5, 'renderSkippedFrames': 0,
+            'renderTotalFrames': int((time.time() - self._started_at) * 30), 'outputSkippedFrames': 0,
+            'outputTotalFrames': self._frames(), 'webSocketSessionIncomingMessages': 0,
+            'webSocketSessionOutgoingMessages': 0})
+
+    async def _request_GetVersion(self, request_type, data):
+        return self._status(request_type, data={'obsVersion': '29.1.0', 'obsWebSocketVersion': '5.1.0',
+                                                'rpcVersion': 1, 'availableRequests': [], 'platform': 'mock'})
+
+    async def _request_GetStreamStatus(self, request_type, data):
+        active = self.stream_started_at is not None
+        duration = 0 if not active else (time.time() - self.stream_started_at) * 1000
+        return self._status(request_type, data={
+            'outputActive': active, 'outputReconnecting': False, 'outputTimecode': _timecode(self.stream_started_at),
+            'outputDuration': duration, 'outputCongestion': 0.0, 'outputBytes': int(duration * 750),
+            'outputSkippedFrames': 0, 'outputTotalFrames': self._frames()})
+
+    async def _request_SetStreamServiceSettings(self, request_type, data):
+        if self.stream_started_at is not None:
+            return self._status(request_type, OUTPUT_RUNNING, 'Stream is active')
+        self.stream_settings = data
+        return self._status(request_type)
+
+    async def _request_StartStream(self, request_type, data):
+        if self.stream_started_at is not None:
+            return self._status(request_type, OUTPUT_RUNNING)
+        self.stream_started_at = time.time()
+        await self.emit('StreamStateChanged', {'outputActive': True, 'outputState': 'OBS_WEBSOCKET_OUTPUT_STARTED'})
+        return self._status(request_type)
+
+    async def _request_StopStream(self, request_type, data):
+        if self.stream_started_at is None:
+            return self._status(request_type, OUTPUT_NOT_RUNNING)
+        self.stream_started_at = None
+        await self.emit('StreamStateChanged', {'outputActive': False, 'outputState': 'OBS_WEBSOCKET_OUTPUT_STOPPED'})
+        return self._status(request_type)
+
+    async def _request_GetRecordStatus(self, request_type, data):
+        active = self.record_started_at is not None
+        duration = 0 if not active else (time.time() - self.record_started_at) * 1000
+        return self._status(request_type, data={
+            'outputActive': active, 'outputPaused': False, 'outputTimecode': _timecode(self.record_started_at),
+            'outputDuration': duration, 'outputBytes': int(duration * 750)})
+
+    async def _request_StartRecord(self, request_type, data):
+        if self.record_started_at is not None:
+            return self._status(request_type, OUTPUT_RUNNING)
+        self.record_started_at = time.time()
+        await self.emit('RecordStateChanged', {'outputActive': True, 'outputState': 'OBS_WEBSOCKET_OUTPUT_STARTED'})
+        return self._status(request_type)
+
+    async def _request_StopRecord(self, request_type, data):
+        if self.record_started_at is None:
+            return self._status(request_type, OUTPUT_NOT_RUNNING)
+        self.record_started_at = None
+        await self.emit('RecordStateChanged', {'outputActive': False, 'outputState': 'OBS_WEBSOCKET_OUTPUT_STOPPED'})
+        return self._status(request_type, data={'outputPath': '/tmp/mock.mkv'})
+
+    async def _request_GetSceneList(self, request_type, data):
+        # OBS отдаёт сцены в обратном порядке, последняя в списке -- верхняя
+        scenes = [{'sceneName': name, 'sceneIndex': index} for index, name in enumerate(self.scenes)]
+        return self._status(request_type, data={'currentProgramSceneName': self.current_scene,
+                                                'currentPreviewSceneName': None, 'scenes': scenes[::-1]})
+
+    async def _request_GetCurrentProgramScene(self, request_type, data):
+        return self._status(request_type, data={'currentProgramSceneName': self.current_scene})
+
+    async def _request_SetCurrentProgramScene(self, request_type, data):
+        if data.get('sceneName') not in self.scenes:
+            return self._status(request_type, RESOURCE_NOT_FOUND, 'No source was found by the name')
+        self.current_scene = data['sceneName']
+        await self.emit('CurrentProgramSceneChanged', {'sceneName': self.current_scene})
+        return self._status(request_type)
+
+    async def _request_GetSourceScreenshot(self, request_type, data):
+        if data.get('sourceName') not in self.scenes:
+            return self._status(request_type, RESOURCE_NOT_FOUND, 'No source was found by the name')
+        image_format = data.get('imageFormat', 'png')
+        return self._status(request_type, data={
+            'imageData': f'data:image/{image_format};base64,' + base64.b64encode(PIXEL_JPEG).decode()})
+
+    async def set_scenes(self, scenes: List[str]):
+        """
+        Replaces the scene list, as if the operator edited it, and notifies clients.
+        """
+        self.scenes = list(scenes)
+        if self.current_scene not in self.scenes:
+            self.current_scene = self.scenes[0]
+            await self.emit('CurrentProgramSceneChanged', {'sceneName': self.current_scene})
+        await self.emit('SceneListChanged', {'scenes': [{'sceneName': name, 'sceneIndex': index}
+                                                        for index, name in enumerate(self.scenes)][::-1]})
+
+
+class MockObsFleet:
+    """
+    Many mock stands on consecutive ports starting with base_port
+    (or on free ports if base_port is 0), all with the same settings.
+    """
+
+    def __init__(self, count: int, host: str = '127.0.0.1', base_port: int = 0, **settings):
+        self.servers = [MockObsServer(host, base_port + i if base_port else 0, **settings) for i in range(count)]
+
+    async def start(self) -> 'MockObsFleet':
+        await asyncio.gather(*(server.start() for server in self.servers))
+        return self
+
+    async def stop(self):
+        await asyncio.gather(*(server.stop() for server in self.servers))
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    def __iter__(self):
+        return iter(self.servers)
+
+    def __len__(self):
+        return len(self.servers)
+
+
+async def _serve_forever(args):
+    fleet = MockObsFleet(args.count, args.host, args.base_port, password=args.password, latency=args.latency,
+                         jitter=args.jitter, loss=args.loss, failure_rate=args.failure_rate)
+    async with fleet:
+        print(f'{len(fleet)} mock OBS stands on {args.host}:{fleet.servers[0].port}..{fleet.servers[-1].port}')
+        await asyncio.Event().wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=1)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--base-port', type=int, default=4455)
+    parser.add_argument('--password', default=None)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='random +- seconds on top of latency')
+    parser.add_argument('--loss', type=float, default=0.0, help='probability that a response is dropped')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='probability that a request fails')
+    try:
+        asyncio.run(_serve_forever(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,30 @@
+import asyncio
+
+import main
+from deadline import DeadlineExceeded
+
+
+def test_bulk_failure_of_one_stand_does_not_fail_others(monkeypatch):
+    async def get_obs_clients(user_id, obs_names):
+        return {name: object() for name in obs_names if name != 'missing'}
+
+    deadlines = []
+
+    async def command(name, obsclient, deadline):
+        deadlines.append(deadline)
+        if name == 'broken':
+            raise RuntimeError('unexpected reply')
+        if name == 'slow':
+            raise DeadlineExceeded('request', deadline)
+        return 200, {'response': 'ok'}
+
+    monkeypatch.setattr(main.conductor, 'get_obs_clients', get_obs_clients)
+    resp = asyncio.run(main.run_bulk('1', ['ok', 'broken', 'slow', 'missing'], command))
+
+    assert resp['ok'] == {'status_code': 200, 'response': {'response': 'ok'}}
+    assert resp['broken']['status_code'] == 500
+    assert 'unexpected reply' in resp['broken']['response']
+    assert resp['slow']['status_code'] == 504
+    assert resp['missing']['status_code'] == 404
+    # у каждого стенда свой бюджет времени
+    assert len({id(deadline) for deadline in deadlines}) == 3
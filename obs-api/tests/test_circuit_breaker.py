@@ -0,0 +1,75 @@
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CircuitBreaker, CircuitBreakerRegistry
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(circuit_breaker.time, 'time', lambda: now[0])
+    return now
+
+
+def test_breaker_opens_after_threshold_and_fails_fast(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.opened_at == 100.0
+    clock[0] += 9.9
+    assert not breaker.allow()
+
+
+def test_success_resets_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.failures == 1
+
+
+def test_half_open_lets_one_trial_through_and_closes_on_success(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock[0] += 10
+
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()  # пробное подключение уже идёт
+
+    breaker.record_success()
+    assert breaker.to_dict() == {'state': CircuitBreaker.CLOSED, 'failures': 0, 'opened_at': None}
+    assert breaker.allow()
+
+
+def test_failed_trial_reopens_for_another_timeout(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10)
+    for _ in range(3):
+        breaker.record_failure()
+    clock[0] += 10
+    assert breaker.allow()
+
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.opened_at == 110.0
+    clock[0] += 5
+    assert not breaker.allow()
+    clock[0] += 5
+    assert breaker.allow()
+
+
+def test_registry_keeps_one_breaker_per_stand(clock):
+    registry = CircuitBreakerRegistry(failure_threshold=1, reset_timeout=10)
+    registry.get('10.0.0.1:4455').record_failure()
+
+    assert registry.get('10.0.0.1:4455') is registry.get('10.0.0.1:4455')
+    assert registry.states()['10.0.0.1:4455']['state'] == CircuitBreaker.OPEN
+    assert registry.get('10.0.0.2:4455').state == CircuitBreaker.CLOSED
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from command_queue import StandCommandQueues
+
+
+def test_cancelled_command_does_not_stall_the_queue():
+    async def scenario():
+        queues = StandCommandQueues()
+        order = []
+
+        async def cancelled():
+            order.append('cancelled')
+            raise asyncio.CancelledError
+
+        async def command(name):
+            order.append(name)
+            return name
+
+        results = await asyncio.gather(queues.run('stand', cancelled, timeout=1),
+                                       queues.run('stand', lambda: command('next'), timeout=1),
+                                       return_exceptions=True)
+
+        assert isinstance(results[0], asyncio.CancelledError)
+        assert results[1] == 'next'
+        assert order == ['cancelled', 'next']
+
+    asyncio.run(scenario())
+
+
+def test_actor_is_dropped_when_its_queue_drains():
+    async def scenario():
+        queues = StandCommandQueues()
+
+        async def command():
+            assert 'stand' in queues.stats()
+            return 1
+
+        assert await queues.run('stand', command) == 1
+        await asyncio.sleep(0)  # обработчик завершается после того, как отдал результат
+        assert queues.stats() == {}
+        assert await queues.run('stand', command) == 1
+
+    asyncio.run(scenario())
+
+
+def test_failed_command_is_reported_to_its_caller_only():
+    async def scenario():
+        queues = StandCommandQueues()
+
+        async def failing():
+            raise RuntimeError('boom')
+
+        async def ok():
+            return 'ok'
+
+        with pytest.raises(RuntimeError):
+            await queues.run('stand', failing)
+        assert await queues.run('stand', ok) == 'ok'
+
+    asyncio.run(scenario())
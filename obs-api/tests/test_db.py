@@ -0,0 +1,274 @@
+"""
+Tests of the set-based SQL in db_class against a real Postgres.
+
+They run only when OBS_API_TEST_DATABASE names a disposable database on the
+server from DB_CONFIG: every test drops and recreates all tables in it.
+
+    OBS_API_TEST_DATABASE=as_db_test python -m pytest tests/test_db.py
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import text
+
+from conductor import Conductor
+from db_class import Database
+from utils import DB_CONFIG
+
+# схема БД описана в db/schema.py в корне репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from db.schema import Base  # noqa: E402
+
+TEST_DATABASE = os.environ.get('OBS_API_TEST_DATABASE')
+
+pytestmark = pytest.mark.skipif(not TEST_DATABASE, reason='OBS_API_TEST_DATABASE is not set')
+
+GROUP = '-100'
+ADMIN = '1'
+
+
+def run(scenario):
+    """
+    Runs scenario(db, conductor) on empty tables in a fresh event loop.
+    """
+    async def wrapper():
+        db = Database(**{**DB_CONFIG, 'database': TEST_DATABASE})
+        try:
+            async with db._engine.begin() as conn:
+                await conn.run_sync(Base.metadata.drop_all)
+                await conn.run_sync(Base.metadata.create_all)
+            await scenario(db, Conductor(db))
+        finally:
+            await db.close()
+
+    asyncio.run(wrapper())
+
+
+async def make_group(conductor: Conductor, members: list):
+    """
+    Group GROUP with admin ADMIN, who has stand 'cam' at 10.0.0.1:4455, and other members.
+    """
+    await conductor.create_group_in_db(GROUP)
+    await conductor.add_groups_users(GROUP, [(ADMIN, True)] + [(user_id, False) for user_id in members])
+    await conductor.add_users_obs(ADMIN, 'cam', '10.0.0.1', '4455', 'secret')
+
+
+async def count_obs_rows(db: Database) -> int:
+    return (await db.execute(text('SELECT count(*) FROM obs'))).scalar()
+
+
+def test_group_stand_is_copied_to_members_and_duplicates_are_skipped():
+    async def scenario(db, conductor):
+        await make_group(conductor, ['2', '3', '4'])
+        await conductor.add_users_obs('3', 'cam', '10.0.0.9', '4455', 'x')  # то же имя
+        await conductor.add_users_obs('4', 'other', '10.0.0.1', '4455', 'x')  # тот же адрес
+
+        result = await conductor.add_groups_obs(GROUP, ADMIN, 'cam')
+
+        assert result == {'added_members': [2], 'skipped_members': [3, 4]}
+        assert await db.get_obs_info('2', 'cam') == ('10.0.0.1', 4455, 'secret')
+        assert [name for name, ip, port in await db.get_groups_obs(GROUP)] == ['cam']
+        # у админа, группы и участника 2 свои строки obs, плюс личные стенды 3 и 4
+        assert await count_obs_rows(db) == 5
+
+    run(scenario)
+
+
+def test_duplicated_group_stand_is_rejected():
+    async def scenario(db, conductor):
+        await make_group(conductor, ['2'])
+        await conductor.add_groups_obs(GROUP, ADMIN, 'cam')
+        with pytest.raises(HTTPException) as err:
+            await conductor.add_groups_obs(GROUP, ADMIN, 'cam')
+        assert err.value.status_code == 409
+        with pytest.raises(HTTPException) as err:
+            await conductor.add_groups_obs(GROUP, ADMIN, 'missing')
+        assert err.value.status_code == 404
+        assert await count_obs_rows(db) == 3
+
+    run(scenario)
+
+
+def test_member_edit_does_not_change_other_copies():
+    async def scenario(db, conductor):
+        await make_group(conductor, ['2'])
+        await conductor.add_groups_obs(GROUP, ADMIN, 'cam')
+
+        await conductor.edit_users_obs('2', 'cam', 'ip', '10.0.0.2')
+
+        assert (await db.get_obs_info('2', 'cam'))[0] == '10.0.0.2'
+        assert (await db.get_obs_info(ADMIN, 'cam'))[0] == '10.0.0.1'
+        assert (await db.get_group_obs_info(GROUP, 'cam'))[0] == '10.0.0.1'
+
+    run(scenario)
+
+
+def test_batch_membership_registers_users_and_inherits_stands():
+    async def scenario(db, conductor):
+        await make_group(conductor, ['2'])
+        await conductor.add_groups_obs(GROUP, ADMIN, 'cam')
+        await conductor.create_user_in_db('3')
+        await conductor.add_users_obs('3', 'cam', '10.0.0.9', '4455', 'x')
+
+        added, existing = await conductor.add_groups_users(GROUP, [('2', False), ('3', False), ('4', False),
+                                                                   ('4', True)])
+
+        assert sorted(added) == ['3', '4'] and existing == ['2']  # повтор '4' учтён один раз
+        assert await db.check_user_in_db('4')
+        assert await db.is_user_admin_of_group(GROUP, '4')
+        assert await db.get_obs_info('4', 'cam') == ('10.0.0.1', 4455, 'secret')
+        assert (await db.get_obs_info('3', 'cam'))[0] == '10.0.0.9'  # свой стенд с тем же именем не тронут
+        # копии у админа, группы, участников 2 и 4, плюс личный стенд 3
+        assert await count_obs_rows(db) == 5
+
+        with pytest.raises(HTTPException) as err:
+            await conductor.add_groups_user(GROUP, '4', False)
+        assert err.value.status_code == 409
+
+    run(scenario)
+
+
+def test_group_stand_edit_updates_group_and_member_copies():
+    async def scenario(db, conductor):
+        await make_group(conductor, ['2', '3'])
+        await conductor.add_users_obs('3', 'cam', '10.0.0.9', '4455', 'x')
+        await conductor.add_groups_obs(GROUP, ADMIN, 'cam')
+
+        updated = await conductor.edit_groups_obs(GROUP, 'cam', 'port', '4460')
+        # строки группы, админа и участника 2; одноимённый личный стенд участника 3 не копия
+        assert updated == {'groups_obs': 1, 'users_obs': 0, 'obs': 3}
+        assert (await db.get_obs_info('2', 'cam'))[1] == 4460
+        assert (await db.get_obs_info('3', 'cam'))[1] == 4455
+
+        updated = await conductor.edit_groups_obs(GROUP, 'cam', 'obs_name', 'main')
+        assert updated == {'groups_obs': 1, 'users_obs': 2, 'obs': 0}
+        assert await db.get_group_obs_names(GROUP) == ['main']
+        assert await db.get_obs_info('2', 'main') is not None
+        assert await db.get_obs_info('3', 'cam') is not None
+
+        with pytest.raises(HTTPException) as err:
+            await conductor.edit_groups_obs(GROUP, 'cam', 'ip', '10.0.0.5')
+        assert err.value.status_code == 404
+        with pytest.raises(HTTPException) as err:
+            await conductor.edit_groups_obs(GROUP, 'main', 'color', 'red')
+        assert err.value.status_code == 400
+
+    run(scenario)
+
+
+def test_group_stand_delete_removes_only_member_copies():
+    async def scenario(db, conductor):
+        await make_group(conductor, ['2', '3', '4'])
+        await conductor.add_users_obs('3', 'cam', '10.0.0.9', '4455', 'x')
+        await conductor.add_users_obs('4', 'own', '10.0.0.4', '4455', 'x')
+        await conductor.add_groups_obs(GROUP, ADMIN, 'cam')
+        assert await count_obs_rows(db) == 6
+
+        deleted_obs_id, affected_members = await conductor.del_groups_obs(GROUP, 'cam')
+
+        assert deleted_obs_id is not None
+        assert affected_members == 2  # копии участников 2 и 4
+        assert await db.get_groups_obs(GROUP) == []
+        assert await db.get_obs_info('2', 'cam') is None
+        assert await db.get_obs_info(ADMIN, 'cam') is not None  # у админа стенд остаётся
+        assert await db.get_obs_info('3', 'cam') is not None  # одноимённый личный стенд не копия
+        assert await db.get_obs_info('4', 'own') is not None
+        # строки obs группы и удалённых копий удалены вместе с ними
+        assert await count_obs_rows(db) == 3
+
+        with pytest.raises(HTTPException) as err:
+            await conductor.del_groups_obs(GROUP, 'cam')
+        assert err.value.status_code == 404
+
+    run(scenario)
+
+
+def test_transaction_runs_on_one_connection_and_commits():
+    async def scenario(db, conductor):
+        pid = text('SELECT pg_backend_pid()')
+        async with db.transaction():
+            first = (await db.execute(pid)).scalar()
+            await db.create_user_in_db('7')
+            async with db.transaction():
+                assert (await db.execute(pid)).scalar() == first
+        assert await db.check_user_in_db('7')
+
+    run(scenario)
+
+
+def test_failed_transaction_is_rolled_back():
+    async def scenario(db, conductor):
+        with pytest.raises(RuntimeError):
+            async with db.transaction():
+                await db.create_user_in_db('7')
+                raise RuntimeError
+        assert not await db.check_user_in_db('7')
+
+        # ошибка во вложенном блоке откатывает и внешний
+        with pytest.raises(HTTPException):
+            async with db.transaction():
+                await db.create_user_in_db('8')
+                async with db.transaction():
+                    await db.create_group_in_db(GROUP)
+                    await conductor.check_group_in_db('missing')
+        assert not await db.check_user_in_db('8')
+        assert not await db.check_group_in_db(GROUP)
+
+        # после отката execute снова работает без транзакции
+        await db.create_user_in_db('9')
+        assert await db.check_user_in_db('9')
+
+    run(scenario)
+
+
+def test_all_stands_skip_orphans_and_pick_password_deterministically():
+    async def scenario(db, conductor):
+        await make_group(conductor, ['2', '3'])
+        await conductor.add_groups_obs(GROUP, ADMIN, 'cam')
+        await conductor.edit_users_obs('3', 'cam', 'password', 'changed')  # у одной копии другой пароль
+        await conductor.add_users_obs('2', 'gone', '10.0.0.7', '4455', 'x')
+        await db.execute(text('DELETE FROM users_obs WHERE "UO_name" = \'gone\''))  # осталась строка obs
+
+        assert await db.get_all_stands() == [('10.0.0.1', 4455, 'secret')]
+
+    run(scenario)
+
+
+def test_user_stand_delete_removes_unreferenced_obs_row():
+    async def scenario(db, conductor):
+        await make_group(conductor, ['2'])
+        await conductor.add_groups_obs(GROUP, ADMIN, 'cam')
+        await conductor.add_users_obs('2', 'own', '10.0.0.4', '4455', 'x')
+        assert await count_obs_rows(db) == 4
+
+        assert await conductor.del_users_obs('2', 'own') == '10.0.0.4'
+        assert await conductor.del_users_obs('2', 'cam') == '10.0.0.1'
+
+        assert await db.get_obs_info('2', 'own') is None
+        assert await db.get_obs_info(ADMIN, 'cam') is not None
+        # остались строки админа и группы
+        assert await count_obs_rows(db) == 2
+
+        with pytest.raises(HTTPException) as err:
+            await conductor.del_users_obs('2', 'own')
+        assert err.value.status_code == 404
+
+    run(scenario)
+
+
+def test_stand_groups_are_found_by_address_not_by_copy():
+    async def scenario(db, conductor):
+        await make_group(conductor, ['2'])
+        await conductor.add_groups_obs(GROUP, ADMIN, 'cam')
+        await conductor.create_group_in_db('-200')
+        await conductor.add_groups_users('-200', [('2', True)])
+        await conductor.add_groups_obs('-200', '2', 'cam')  # копия участника 2 стала стендом второй группы
+
+        # копий стенда по этому адресу пять, в группах из них только две
+        assert await db.find_obs_groups('10.0.0.1', '4455') == ['-100', '-200']
+        assert await db.find_obs_groups('10.0.0.9', '4455') == []
+
+    run(scenario)
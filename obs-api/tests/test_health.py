@@ -0,0 +1,31 @@
+import asyncio
+
+from health import HealthProbeScheduler
+
+
+class StandsDb:
+    def __init__(self, count: int):
+        self.stands = [('10.0.0.1', 5000 + i, 'pswd') for i in range(count)]
+
+    async def get_all_stands(self):
+        return self.stands
+
+
+def scheduler(db, max_stands: int) -> HealthProbeScheduler:
+    return HealthProbeScheduler(db, idle_interval=30, active_interval=5, jitter=0.2, concurrency=2, ttl=60,
+                                timeout=1, stands_refresh=60, max_stands=max_stands)
+
+
+def test_probed_stands_are_capped_to_pool_size():
+    async def scenario():
+        db = StandsDb(5)
+        monitor = scheduler(db, max_stands=3)
+        await monitor._load_stands()
+        assert len(monitor._stands) == 3
+
+        db.stands = db.stands[:2]  # удалённые стенды больше не проверяются
+        await monitor._load_stands()
+        assert sorted(monitor._stands) == ['10.0.0.1:5000', '10.0.0.1:5001']
+        assert sorted(monitor._next_probe) == ['10.0.0.1:5000', '10.0.0.1:5001']
+
+    asyncio.run(scenario())
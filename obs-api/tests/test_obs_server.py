@@ -1,2 +1,246 @@
+import asyncio
+import socket
+
+import pytest
+import simpleobsws
+
+from circuit_breaker import CircuitBreaker, CircuitBreakerRegistry
+from deadline import Deadline, DeadlineExceeded
+from obs_functions import obs_call, batch_failure, start_stream_batch, stop_stream_batch, start_recording_batch, \
+    ping_stream, get_scenes, set_scene, scene_exists, OUTPUT_RUNNING
+from obs_client import ObsClient, MSGPACK_SUBPROTOCOL
+from obs_sessions import connection_manager, ObsConnectionError, ObsConnectionManager, stand_key
+from obs_state import stand_states
+from .mock_obs_server import MockObsServer, MockObsFleet
+
+
+def run(scenario):
+    """
+    Runs a scenario in a fresh event loop and closes pooled sessions after it.
+    """
+    async def wrapper():
+        try:
+            await scenario
+        finally:
+            await connection_manager.close()
+
+    asyncio.run(wrapper())
+
+
+def client_for(server: MockObsServer):
+    return connection_manager.get_client(server.host, server.port, server.password)
+
+
 def test_ping():
     pass
+
+
+def test_authenticated_get_stats():
+    async def scenario():
+        async with MockObsServer(password='secret') as server:
+            ret = await obs_call(client_for(server), simpleobsws.Request('GetStats'))
+            assert ret.ok()
+            assert 'cpuUsage' in ret.responseData
+
+    run(scenario())
+
+
+def test_wrong_password_is_rejected():
+    async def scenario():
+        async with MockObsServer(password='secret') as server:
+            obsclient = connection_manager.get_client(server.host, server.port, 'wrong')
+            with pytest.raises((ObsConnectionError, DeadlineExceeded)):
+                await obs_call(obsclient, simpleobsws.Request('GetStats'), Deadline(1))
+
+    run(scenario())
+
+
+def test_stream_and_recording_start_stop():
+    async def scenario():
+        async with MockObsServer() as server:
+            obsclient = client_for(server)
+            assert batch_failure(await start_stream_batch(obsclient, 'key')) is None
+            assert server.stream_settings['streamServiceSettings']['key'] == 'key'
+            failed = batch_failure(await start_stream_batch(obsclient, 'key'))
+            assert failed.requestStatus.code == OUTPUT_RUNNING
+
+            await asyncio.sleep(0.05)  # StreamStateChanged
+            assert stand_states.state(stand_key(server.host, server.port)).stream_active
+            assert await ping_stream(obsclient)
+
+            assert batch_failure(await start_recording_batch(obsclient)) is None
+            assert server.record_started_at is not None
+            assert batch_failure(await stop_stream_batch(obsclient)) is None
+            await asyncio.sleep(0.05)
+            assert not await ping_stream(obsclient)
+
+    run(scenario())
+
+
+def test_scene_catalog_follows_events():
+    async def scenario():
+        async with MockObsServer(scenes=['Scene', 'Camera']) as server:
+            obsclient = client_for(server)
+            assert (await get_scenes(obsclient))['current'] == 'Scene'
+            assert await scene_exists(obsclient, 'Camera')
+            assert not await scene_exists(obsclient, 'Cam')
+
+            await set_scene(obsclient, 'Camera')
+            await server.set_scenes(['Slides', 'Camera'])
+            await asyncio.sleep(0.05)
+            scenes = await get_scenes(obsclient)
+            assert scenes['current'] == 'Camera'
+            assert sorted(scenes['all']) == ['Camera', 'Slides']
+            assert server.requests['GetSceneList'] == 1
+
+    run(scenario())
+
+
+def test_password_change_does_not_close_leased_session():
+    async def scenario():
+        async with MockObsServer() as server:
+            old_client = connection_manager.get_client(server.host, server.port, 'old')
+            async with connection_manager.lease(old_client) as client:
+                new_client = connection_manager.get_client(server.host, server.port, 'new')
+                assert new_client is not old_client
+                await asyncio.sleep(0.05)
+                assert (await client.call(simpleobsws.Request('GetStats'))).ok()
+            await asyncio.sleep(0.05)
+            assert old_client.ws is None or not old_client.ws.open  # закрыта после последней аренды
+            assert (await obs_call(new_client, simpleobsws.Request('GetStats'))).ok()
+
+    run(scenario())
+
+
+def test_exhausted_retries_count_as_one_breaker_failure():
+    async def scenario():
+        with socket.socket() as sock:  # порт, который никто не слушает
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        breakers = CircuitBreakerRegistry(failure_threshold=2, reset_timeout=30)
+        manager = ObsConnectionManager(breakers, max_connections=4, idle_timeout=60, reconnect_attempts=3,
+                                       backoff_base=0.01, backoff_max=0.01)
+        obsclient = manager.get_client('127.0.0.1', port, 'pswd')
+        try:
+            with pytest.raises(ObsConnectionError):
+                async with manager.lease(obsclient, Deadline(5)):
+                    pass
+            breaker = breakers.get(stand_key('127.0.0.1', port))
+            assert breaker.failures == 1
+            assert breaker.state == CircuitBreaker.CLOSED
+        finally:
+            await manager.close()
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_reads_are_coalesced():
+    async def scenario():
+        async with MockObsServer(latency=0.05) as server:
+            obsclient = client_for(server)
+            results = await asyncio.gather(*(obs_call(obsclient, simpleobsws.Request('GetStats'))
+                                             for _ in range(50)))
+            assert all(ret.ok() for ret in results)
+            assert server.requests['GetStats'] == 1
+
+    run(scenario())
+
+
+def test_coalesced_read_is_not_cut_by_other_callers_deadline():
+    async def scenario():
+        async with MockObsServer(latency=0.5) as server:
+            obsclient = client_for(server)
+            short, long = await asyncio.gather(obs_call(obsclient, simpleobsws.Request('GetStats'), Deadline(0.2)),
+                                               obs_call(obsclient, simpleobsws.Request('GetStats'), Deadline(5)),
+                                               return_exceptions=True)
+            assert isinstance(short, DeadlineExceeded)
+            assert short.to_dict()['budget_ms'] == 200
+            assert long.ok()
+            assert server.requests['GetStats'] == 1
+
+    run(scenario())
+
+
+def test_commands_to_one_stand_run_in_order():
+    async def scenario():
+        # с джиттером ответы могли бы прийти не по порядку, если бы команды шли одновременно
+        async with MockObsServer(latency=0.02, jitter=0.02, seed=1) as server:
+            obsclient = client_for(server)
+            results = await asyncio.gather(start_recording_batch(obsclient),
+                                           obs_call(obsclient, simpleobsws.Request('StopRecord')),
+                                           start_recording_batch(obsclient))
+            assert batch_failure(results[0]) is None
+            assert results[1].ok()
+            assert batch_failure(results[2]) is None
+            assert server.record_started_at is not None
+
+    run(scenario())
+
+
+def test_lost_response_hits_deadline():
+    async def scenario():
+        async with MockObsServer(loss=1.0) as server:
+            with pytest.raises(DeadlineExceeded):
+                await obs_call(client_for(server), simpleobsws.Request('GetStats'), Deadline(0.5))
+
+    run(scenario())
+
+
+def test_injected_failure_is_reported():
+    async def scenario():
+        async with MockObsServer(fail_requests={'StartStream': 702}) as server:
+            failed = batch_failure(await start_stream_batch(client_for(server), 'key'))
+            assert failed.requestType == 'StartStream'
+            assert server.stream_started_at is None
+
+    run(scenario())
+
+
+def test_fleet_warm_up():
+    async def scenario():
+        async with MockObsFleet(30, password='secret', latency=0.01) as fleet:
+            stands = [(server.host, server.port, server.password) for server in fleet]
+            results = await connection_manager.warm_up(stands, concurrency=10, timeout=5)
+            assert len(results) == 30
+            assert all(results.values())
+            assert all(server.connections == 1 for server in fleet)
+
+    run(scenario())
+
+
+def test_native_client_over_msgpack():
+    async def scenario():
+        async with MockObsServer(password='secret') as server:
+            client = ObsClient(url=server.url, password='secret')
+            await client.connect()
+            assert await client.wait_until_identified(timeout=2)
+            assert client.subprotocol == MSGPACK_SUBPROTOCOL
+            results = await client.call_batch([simpleobsws.Request('StartRecord'),
+                                               simpleobsws.Request('GetRecordStatus')])
+            assert results[1].responseData['outputActive']
+            await client.disconnect()
+
+    pytest.importorskip('msgpack')
+    run(scenario())
+
+
+def test_native_client_sends_empty_request_data_in_single_calls_and_batches():
+    async def scenario():
+        client = ObsClient()
+        payloads = []
+
+        async def request(op, payload, timeout, description):
+            payloads.append(payload)
+            result = {'requestType': 'GetStats', 'requestStatus': {'result': True, 'code': 100}}
+            return {'results': [result]} if op == 8 else result
+
+        client._request = request
+        await client.call(simpleobsws.Request('GetStats', {}))
+        await client.call_batch([simpleobsws.Request('GetStats', {})])
+        await client.call(simpleobsws.Request('GetStats'))
+
+        assert payloads[0]['requestData'] == {}
+        assert payloads[1]['requests'][0]['requestData'] == {}
+        assert 'requestData' not in payloads[2]
+
+    asyncio.run(scenario())
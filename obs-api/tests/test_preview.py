@@ -0,0 +1,19 @@
+from urllib.parse import unquote
+
+from fastapi.responses import Response
+
+from preview import Preview
+
+
+def test_preview_headers_with_non_ascii_scene_name():
+    preview = Preview(b'jpeg', 'Сцена 1')
+    headers = preview.headers(3)
+    response = Response(content=preview.image, media_type='image/jpeg', headers=headers)
+    assert response.headers['etag'] == preview.etag
+    assert response.headers['cache-control'] == 'max-age=3'
+    assert unquote(response.headers['x-scene-name']) == 'Сцена 1'
+
+
+def test_preview_etag_follows_image():
+    assert Preview(b'a', 'Scene').etag == Preview(b'a', 'Camera').etag
+    assert Preview(b'a', 'Scene').etag != Preview(b'b', 'Scene').etag
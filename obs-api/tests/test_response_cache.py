@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+import response_cache
+from response_cache import ResponseCache, group_tag, stand_tag, user_tag
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(response_cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_entry_expires_after_ttl(clock):
+    cache = ResponseCache(max_entries=10, ttl=5)
+    cache.put('a', 1, [user_tag(1)])
+
+    clock[0] += 5
+    assert cache.get('a') == 1
+    clock[0] += 0.1
+    assert cache.get('a') is None
+    assert cache.stats()['entries'] == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_invalidate_drops_only_tagged_entries(clock):
+    cache = ResponseCache(max_entries=10, ttl=60)
+    cache.put('user', 1, [user_tag(1)])
+    cache.put('group', 2, [group_tag(-100), stand_tag('10.0.0.1', 4455)])
+    cache.put('other', 3, [user_tag(2)])
+
+    cache.invalidate(stand_tag('10.0.0.1', 4455), user_tag(1))
+
+    assert cache.get('user') is None and cache.get('group') is None
+    assert cache.get('other') == 3
+    assert cache.invalidations == 2
+    cache.invalidate(group_tag(-100))  # тег удалённой записи уже ни на что не указывает
+    assert cache.invalidations == 2
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = ResponseCache(max_entries=2, ttl=60)
+    cache.put('a', 1, [])
+    cache.put('b', 2, [])
+    cache.get('a')
+
+    cache.put('c', 3, [])
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.evictions == 1
+
+
+def test_put_replaces_entry_and_its_tags(clock):
+    cache = ResponseCache(max_entries=10, ttl=60)
+    cache.put('a', 1, [user_tag(1)])
+    cache.put('a', 2, [user_tag(2)])
+
+    cache.invalidate(user_tag(1))
+
+    assert cache.get('a') == 2
+
+
+def test_value_loaded_during_invalidation_is_not_cached(clock):
+    cache = ResponseCache(max_entries=10, ttl=60)
+
+    async def scenario():
+        async def stale_loader():
+            cache.invalidate(user_tag(1))  # запись в БД, пока шло чтение
+            return 'stale'
+
+        assert await cache.get_or_load('a', stale_loader, [user_tag(1)]) == 'stale'
+        assert cache.get('a') is None
+
+        async def loader():
+            return {'user_id': 1}
+
+        assert await cache.get_or_load('a', loader, lambda value: [user_tag(value['user_id'])]) == {'user_id': 1}
+        cache.invalidate(user_tag(1))
+        assert cache.get('a') is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,43 @@
+import asyncio
+import json
+
+import pytest
+
+import main
+
+
+class FakeWebSocket:
+    """
+    The part of starlette's WebSocket that stand_states_ws uses before subscribing.
+    """
+
+    def __init__(self, message: str):
+        self.message = message
+        self.sent = []
+        self.close_code = None
+
+    async def accept(self):
+        pass
+
+    async def receive_json(self):
+        return json.loads(self.message)
+
+    async def send_json(self, data):
+        self.sent.append(data)
+
+    async def close(self, code: int = 1000):
+        self.close_code = code
+
+
+@pytest.mark.parametrize('message, code', [
+    ('not json', 1003),
+    ('{"group": "abc"}', 1008),
+    ('["user_id"]', 1008),
+])
+def test_bad_subscription_request_closes_socket(message, code):
+    websocket = FakeWebSocket(message)
+
+    asyncio.run(main.stand_states_ws(websocket))
+
+    assert websocket.close_code == code
+    assert websocket.sent == []
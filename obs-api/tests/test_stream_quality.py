@@ -0,0 +1,29 @@
+import asyncio
+
+import stream_quality
+from stream_quality import StreamQualityMonitor
+
+
+def test_monitor_survives_iteration_error(monkeypatch):
+    calls = []
+
+    def clients():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError('pool is being rebuilt')
+        return {}
+
+    monkeypatch.setattr(stream_quality.connection_manager, 'clients', clients)
+
+    async def scenario():
+        monitor = StreamQualityMonitor(interval=0.01, timeout=1, min_bitrate_kbps=0, max_drop_rate=1,
+                                       max_congestion=1)
+        monitor.start()
+        await asyncio.sleep(0.1)
+        task = monitor._task
+        await monitor.stop()
+        return task
+
+    task = asyncio.run(scenario())
+    assert len(calls) > 1
+    assert task.cancelled()
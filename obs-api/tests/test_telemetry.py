@@ -0,0 +1,73 @@
+import pytest
+from pydantic import ValidationError
+
+import telemetry
+from schemas import ObsStatsModel
+from telemetry import StatsRingBuffer
+
+NOW = 1000.0
+
+
+@pytest.fixture(autouse=True)
+def frozen_time(monkeypatch):
+    monkeypatch.setattr(telemetry.time, 'time', lambda: NOW)
+
+
+def filled(capacity: int, timestamps: list) -> StatsRingBuffer:
+    buffer = StatsRingBuffer(capacity)
+    for timestamp in timestamps:
+        buffer.append(timestamp, {'cpuUsage': timestamp - NOW})
+    return buffer
+
+
+def test_summary_downsamples_window_into_buckets():
+    buffer = filled(10, [NOW - 9, NOW - 8, NOW - 4, NOW - 3])
+
+    summary = buffer.summary(window=10, points=2)
+
+    assert summary['samples'] == 4
+    assert summary['metrics']['cpuUsage'] == {'min': -9, 'max': -3, 'mean': -6}
+    assert [point['t'] for point in summary['points']] == [NOW - 10, NOW - 5]
+    assert [point['cpuUsage'] for point in summary['points']] == [-8.5, -3.5]
+
+
+def test_summary_skips_samples_older_than_window_and_overwritten_ones():
+    buffer = filled(3, [NOW - 50, NOW - 3, NOW - 2, NOW - 1])  # первый сэмпл вытеснен
+
+    assert buffer.summary(window=100, points=10)['samples'] == 3
+    assert buffer.summary(window=2, points=10)['samples'] == 2  # сэмпл ровно на границе окна входит
+    empty = buffer.summary(window=0.5, points=10)
+    assert empty == {'samples': 0, 'metrics': {}, 'points': []}
+
+
+def test_summary_edge_samples_stay_in_range():
+    # сэмпл ровно "сейчас" и сэмпл из будущего (часы стенда спешат) попадают в последнюю точку
+    buffer = filled(10, [NOW - 10, NOW, NOW + 5])
+
+    points = buffer.summary(window=10, points=5)['points']
+
+    assert [point['t'] for point in points] == [NOW - 10, NOW - 2]
+    assert points[-1]['cpuUsage'] == 2.5
+    assert len(buffer.summary(window=10, points=1)['points']) == 1
+
+
+@pytest.mark.parametrize('window, points', [(0, 10), (10, 0), (-5, 10)])
+def test_summary_rejects_non_positive_arguments(window, points):
+    with pytest.raises(ValueError):
+        filled(10, [NOW]).summary(window=window, points=points)
+
+
+@pytest.mark.parametrize('field, value', [('window', 0), ('window', 86401), ('points', 0), ('points', 721)])
+def test_stats_request_bounds(field, value):
+    with pytest.raises(ValidationError):
+        ObsStatsModel(user_id='1', obs_name='obs_0', **{field: value})
+
+
+def test_sample_from_a_clock_step_back_keeps_time_order():
+    buffer = filled(10, [NOW - 5, NOW - 8])  # часы отошли назад на 3 секунды
+
+    summary = buffer.summary(window=6, points=3)
+
+    assert summary['samples'] == 2
+    assert [point['t'] for point in summary['points']] == [NOW - 6]
+    assert summary['points'][0]['cpuUsage'] == -6.5
@@ -1,4 +1,5 @@
-from typing import Any, Union, Tuple
+import asyncio
+from typing import Any, Union, Tuple, Callable, Iterable, List
 from schemas import CalendarData, CalendarDataStop
 import simpleobsws
 
@@ -10,6 +11,91 @@ DB_CONFIG = {
     "password": "as_pass",
     "database": 'as_db'}
 
+# Параметры пула соединений с OBS (одна опознанная сессия на стенд)
+OBS_POOL_CONFIG = {
+    "max_connections": 64,  # максимум одновременно открытых сессий
+    "idle_timeout": 300,  # через сколько секунд простоя сессия закрывается
+    "reconnect_attempts": 3,
+    "backoff_base": 0.5,  # задержка перед первой повторной попыткой, сек
+    "backoff_max": 5}
+
+# Клиент obs-websocket: native -- собственный obs_client.ObsClient вместо simpleobsws,
+# msgpack -- договариваться о бинарном протоколе obswebsocket.msgpack (нужен пакет msgpack)
+OBS_CLIENT_CONFIG = {
+    "native": False,
+    "msgpack": True}
+
+# Circuit breaker стендов: после failure_threshold неудачных подключений подряд
+# стенд reset_timeout секунд считается недоступным без попыток подключения
+OBS_CIRCUIT_CONFIG = {
+    "failure_threshold": 5,
+    "reset_timeout": 30}
+
+# Кэш состояния стендов: без подписки на события состояние считается
+# актуальным max_age секунд
+OBS_STATE_CONFIG = {
+    "max_age": 5}
+
+# Бюджет времени одного запроса к API и таймауты отдельных фаз работы с OBS, сек
+OBS_TIMEOUTS = {
+    "budget": 10,
+    "connect": 3,
+    "identify": 3,
+    "request": 5}
+
+# Фоновая проверка доступности всех стендов из таблицы obs
+OBS_HEALTH_CONFIG = {
+    "idle_interval": 30,  # как часто проверяем простаивающий стенд, сек
+    "active_interval": 5,  # как часто проверяем стенд, на котором идёт стрим или запись
+    "jitter": 0.2,  # интервал случайно растягивается или сжимается на эту долю
+    "concurrency": 10,
+    "ttl": 60,  # сколько секунд результат проверки считается актуальным
+    "timeout": 3,
+    "stands_refresh": 60,  # как часто перечитываем список стендов из БД
+    "max_stands": OBS_POOL_CONFIG["max_connections"]}  # проверки идут через общий пул сессий
+
+# Сколько последних сэмплов GetStats хранится на каждый стенд
+OBS_TELEMETRY_CONFIG = {
+    "capacity": 720}
+
+# Мониторинг качества идущего стрима и пороги для предупреждений
+OBS_STREAM_QUALITY_CONFIG = {
+    "interval": 2,  # как часто снимаем GetStreamStatus со стендов в эфире, сек
+    "timeout": 2,
+    "min_bitrate_kbps": 1000,
+    "max_drop_rate": 0.01,  # доля пропущенных кадров
+    "max_congestion": 0.5}
+
+# Превью Program выхода стенда (/get_preview): маленький JPEG, который OBS
+# сжимает сама; снимок переиспользуется ttl секунд
+OBS_PREVIEW_CONFIG = {
+    "ttl": 3,
+    "width": 480,
+    "height": 270,
+    "quality": 60}  # качество JPEG, 0..100
+
+# Параллельная проверка доступности стендов (/check_obs)
+OBS_PROBE_CONFIG = {
+    "concurrency": 10,  # сколько стендов проверяется одновременно
+    "timeout": 3}  # сколько секунд ждём один стенд
+
+
+# Массовый запуск и остановка стрима/записи на нескольких стендах
+OBS_BULK_CONFIG = {
+    "concurrency": 20}  # сколько стендов обрабатывается одновременно
+
+
+# Прогрев при старте API: заранее подключаемся и опознаёмся на всех стендах из таблицы obs
+OBS_WARMUP_CONFIG = {
+    "concurrency": 20,  # сколько стендов подключается одновременно
+    "timeout": 5}  # сколько секунд ждём один стенд
+
+
+# Кэш ответов читающих эндпоинтов (/check_obs, /get_obs_info, ...), сбрасывается при изменениях в БД
+RESPONSE_CACHE_CONFIG = {
+    "max_entries": 10000,  # сколько ответов храним, старые вытесняются (LRU)
+    "ttl": 300}  # через сколько секунд ответ устаревает, даже если не было изменений
+
 
 def check_intersect(first, second):
     if (second[0] <= first[0]) and (first[1] <= second[1]):
@@ -47,3 +133,17 @@ CalendarDataStop]):
         password=password,
         identification_parameters=parameters)
     return obsclient
+
+
+async def run_bounded(func: Callable, items: Iterable, limit: int) -> List[Any]:
+    """
+    Runs func(item) for all items concurrently, but no more than limit
+    at a time. Results are returned in the order of items.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(item):
+        async with semaphore:
+            return await func(item)
+
+    return await asyncio.gather(*(run(item) for item in items))
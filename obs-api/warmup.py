@@ -0,0 +1,57 @@
+import asyncio
+import time
+from typing import Dict, Optional
+
+from loguru import logger
+
+from db_class import Database
+from obs_sessions import connection_manager
+
+
+class StandWarmUp:
+    """
+    Startup phase that loads all stands users and groups have and opens
+    identified pooled sessions to them in the background. The API is ready
+    once the warm-up has finished, whether or not every stand answered.
+    """
+
+    def __init__(self, db: Database, concurrency: int, timeout: float):
+        self.db = db
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.results: Dict[str, bool] = {}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._task = None
+
+    @property
+    def ready(self) -> bool:
+        return self.finished_at is not None
+
+    async def _run(self):
+        try:
+            stands = await self.db.get_all_stands()
+            self.results = await connection_manager.warm_up(list(stands), self.concurrency, self.timeout)
+            logger.info(f'Warmed up {sum(self.results.values())} of {len(stands)} OBS stands '
+                        f'in {time.monotonic() - self.started_at:.1f} s')
+        except Exception as err:
+            logger.error(f'OBS warm-up failed: {err}')
+        finally:
+            self.finished_at = time.monotonic()
+
+    def start(self):
+        if self._task is None:
+            self.started_at = time.monotonic()
+            self._task = asyncio.get_event_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def to_dict(self) -> dict:
+        end = self.finished_at if self.ready else time.monotonic()
+        return {'warmed_up': self.ready,
+                'stands': len(self.results),
+                'identified': sum(self.results.values()),
+                'duration_ms': round((end - self.started_at) * 1000, 1) if self.started_at is not None else None}
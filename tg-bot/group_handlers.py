@@ -475,24 +475,16 @@ async def chat_member(message: Message, state: FSMContext, bot: Bot):
         if response.status_code == 200:
             await bot.send_message(message.chat.id, 'Вижу группу. Теперь можно добавлять участников!')
 
-            body = {"user_id": message.from_user.id}
-            url = 'http://127.0.0.1:8000/register_user'  # регистрируем нового пользователя
-            response = requests.post(url, data=json.dumps(body))
-            logger.info(f'Sent user_id and received {str(response.status_code)}')
-            logger.info(f'Sent user_id and received {str(response.content)}')
-
-            if response.status_code != 200:
+            # один запрос и регистрирует пользователя, и добавляет его в группу
+            body = {"group_id": message.chat.id, "members": [{"user_id": message.from_user.id, "is_admin": True}]}
+            url = 'http://127.0.0.1:8000/add_group_members'
+            user_response = requests.post(url, data=json.dumps(body))
+            logger.info(f'Sent group member and received {str(user_response.status_code)}')
+            if user_response.status_code == 200 and str(message.from_user.id) in user_response.json()['added']:
                 user_str = get_username_or_id(message.from_user)
-                await message.answer(f'Произошла ошибка при добавлении @{user_str}. Пожалуйста, обратитесь к команде проекта СВТ-31.')
+                await bot.send_message(message.chat.id, f'Добавлен админ {user_str}')
             else:
-                body = {"group_id": message.chat.id, "user_id": message.from_user.id, "is_admin": True}
-                url = 'http://127.0.0.1:8000/add_group_member'
-                user_response = requests.post(url, data=json.dumps(body))
-                if user_response.status_code == 200:
-                    user_str = get_username_or_id(message.from_user)
-                    await bot.send_message(message.chat.id, f'Добавлен админ {user_str}')
-                else:
-                    await bot.send_message(message.chat.id, 'Произошла ошибка добавления пользователя.')
+                await bot.send_message(message.chat.id, 'Произошла ошибка добавления пользователя.')
         elif response.status_code == 409:
             await bot.send_message(message.chat.id, 'Группа уже добавлена.')
         else:
@@ -531,24 +523,22 @@ async def chat_member(event: ChatMemberUpdated, bot: Bot):
     user_id = event.new_chat_member.user.id
 
     if user_id != bot.id:
-        body = {"user_id": user_id}
-        url = 'http://127.0.0.1:8000/register_user'  # регистрируем нового пользователя
+        is_admin = await check_admin(bot, event.chat.id, user_id)
+        # незарегистрированный пользователь создаётся тем же запросом.
+        # Bot API не отдаёт список участников чата, а /start работает только в чате
+        # из админа и бота, поэтому участники приходят по одному, с событием входа;
+        # пачкой /add_group_members принимает их только от других клиентов API
+        body = {"group_id": event.chat.id, "members": [{"user_id": user_id, "is_admin": is_admin}]}
+        url = 'http://127.0.0.1:8000/add_group_members'
         response = requests.post(url, data=json.dumps(body))
-        logger.info(f'user join group Sent user_id and received {str(response.status_code)}')
-        logger.info(f'user join group Sent user_id and received {str(response.content)}')
-        if response.status_code != 200:
-            await bot.send_message(event.chat.id, 'Произошла ошибка. Пожалуйста, обратитесь к команде проекта СВТ-31.')
-        else:
-            is_admin = await check_admin(bot, event.chat.id, user_id)
-            body = {"group_id": event.chat.id, "user_id": user_id, "is_admin": is_admin}
-            url = 'http://127.0.0.1:8000/add_group_member'
-            response = requests.post(url, data=json.dumps(body))
+        logger.info(f'user join group Sent group member and received {str(response.status_code)}')
+        logger.info(f'user join group Sent group member and received {str(response.content)}')
 
-            if response.status_code == 200:
-                user_str = get_username_or_id(event.new_chat_member.user)
-                await bot.send_message(event.chat.id, f'Добавлен пользователь {user_str}')
-            else:
-                await bot.send_message(event.chat.id, 'Произошла ошибка добавления пользователя.')
+        if response.status_code == 200 and str(user_id) in response.json()['added']:
+            user_str = get_username_or_id(event.new_chat_member.user)
+            await bot.send_message(event.chat.id, f'Добавлен пользователь {user_str}')
+        else:
+            await bot.send_message(event.chat.id, 'Произошла ошибка добавления пользователя.')
 
 
 @router.chat_member(ChatMemberUpdatedFilter(member_status_changed=LEAVE_TRANSITION))